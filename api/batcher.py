@@ -0,0 +1,107 @@
+import asyncio
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from src.utils.logger import get_logger
+
+logger = get_logger("serving.log")
+
+
+class MicroBatcher:
+    """
+    coalesce concurrent prediction calls into micro-batches.
+
+    every request puts its rows on a queue. a single background task takes
+    the first waiting request, keeps collecting until `max_batch_size` rows
+    are queued or `max_wait_ms` has passed, then runs `predict_fn` once on
+    the stacked batch and hands each caller back its own slice.
+
+    args:
+    predict_fn: callable taking a 2d array and returning one value per row.
+    max_batch_size: upper bound of rows per predict call.
+    max_wait_ms: how long the first request of a batch may wait for company.
+    """
+
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"micro-batcher started: max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # fail whatever is still waiting so no caller hangs.
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("prediction service is shutting down"))
+        logger.info("micro-batcher stopped.")
+
+    async def submit(self, rows: np.ndarray) -> np.ndarray:
+        """queue `rows` for the next batch and wait for their predictions."""
+        if self._task is None:
+            raise RuntimeError("micro-batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            batch = [item]
+            size = len(item[0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                size += len(item[0])
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        X = np.concatenate([rows for rows, _ in batch], axis=0)
+        try:
+            # run the model off the event loop so new requests keep queueing.
+            preds = await loop.run_in_executor(None, self.predict_fn, X)
+        except Exception as e:
+            logger.exception(f"batch prediction failed for {len(X)} rows: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for rows, future in batch:
+            n = len(rows)
+            if not future.done():
+                future.set_result(preds[offset:offset + n])
+            offset += n
@@ -0,0 +1,144 @@
+"""
+binary payloads for the bulk endpoints.
+
+.npy bodies are wrapped with np.frombuffer after parsing only the header, so
+a feature matrix is never parsed row by row (or copied) before scoring.
+arrow ipc needs pyarrow, which is imported on first use.
+"""
+import io
+from typing import Tuple
+
+import numpy as np
+
+from src.utils.schema import FEATURE_COLUMNS
+
+NPY_MEDIA_TYPE = "application/x-npy"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NPY_MAGIC = b"\x93NUMPY"
+
+
+class PayloadError(ValueError):
+    """the request body is not a valid feature matrix."""
+
+
+def parse_npy_header(buffer: bytes) -> Tuple[tuple, np.dtype, bool, int]:
+    """
+    read the header of an .npy payload.
+
+    return:
+    shape, dtype, fortran_order and the byte offset where the data starts.
+
+    raises:
+    EOFError when `buffer` does not hold the full header yet.
+    """
+    if len(buffer) < 8:
+        raise EOFError("incomplete npy header")
+    if buffer[:6] != NPY_MAGIC:
+        raise PayloadError("not an npy payload")
+    major = buffer[6]
+    if major not in (1, 2):
+        raise PayloadError(f"unsupported npy format version {major}")
+
+    length_size = 2 if major == 1 else 4
+    if len(buffer) < 8 + length_size:
+        raise EOFError("incomplete npy header")
+    offset = 8 + length_size + int.from_bytes(buffer[8:8 + length_size], "little")
+    if len(buffer) < offset:
+        raise EOFError("incomplete npy header")
+
+    stream = io.BytesIO(buffer[:offset])
+    np.lib.format.read_magic(stream)
+    try:
+        if major == 1:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise PayloadError(f"invalid npy header: {e}")
+
+    if dtype.hasobject:
+        raise PayloadError("object arrays are not accepted")
+    if dtype.kind not in "biuf":
+        raise PayloadError(f"expected a numeric dtype, got {dtype}")
+    if len(shape) != 2 or shape[1] != len(FEATURE_COLUMNS):
+        raise PayloadError(f"expected shape (n, {len(FEATURE_COLUMNS)}), got {shape}")
+    return shape, dtype, fortran_order, offset
+
+
+def check_finite(X: np.ndarray) -> np.ndarray:
+    """raise PayloadError when the feature matrix holds nan or inf."""
+    if X.dtype.kind == "f" and not np.isfinite(X).all():
+        raise PayloadError("feature matrix contains nan or inf values")
+    return X
+
+
+def npy_to_array(body: bytes) -> np.ndarray:
+    """zero-copy view of an .npy body as a 2d feature matrix."""
+    try:
+        shape, dtype, fortran_order, offset = parse_npy_header(body)
+    except EOFError:
+        raise PayloadError("npy payload is truncated")
+    count = shape[0] * shape[1]
+    if len(body) - offset < count * dtype.itemsize:
+        raise PayloadError("npy payload is truncated")
+    data = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+    return check_finite(data.reshape(shape, order="F" if fortran_order else "C"))
+
+
+def npy_header(shape: tuple, dtype=np.float64) -> bytes:
+    """header bytes of an .npy file, for responses whose rows are streamed afterwards."""
+    stream = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        stream, {"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": shape}
+    )
+    return stream.getvalue()
+
+
+def array_to_npy(array: np.ndarray) -> bytes:
+    array = np.ascontiguousarray(array)
+    return npy_header(array.shape, array.dtype) + array.tobytes()
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise PayloadError("arrow payloads need pyarrow installed on the server")
+    return pa
+
+
+def arrow_to_array(body: bytes) -> np.ndarray:
+    """
+    feature matrix from an arrow ipc stream.
+
+    columns are matched by the names in FEATURE_COLUMNS when present,
+    otherwise taken positionally; each column is converted without copying
+    where arrow allows and stacked once into a float32 matrix.
+    """
+    pa = _pyarrow()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise PayloadError(f"not an arrow ipc stream: {e}")
+
+    if all(col in table.column_names for col in FEATURE_COLUMNS):
+        columns = [table.column(col) for col in FEATURE_COLUMNS]
+    elif table.num_columns == len(FEATURE_COLUMNS):
+        columns = table.columns
+    else:
+        raise PayloadError(f"expected the {len(FEATURE_COLUMNS)} feature columns, got {table.column_names}")
+
+    X = np.empty((table.num_rows, len(columns)), dtype=np.float32)
+    for j, column in enumerate(columns):
+        X[:, j] = column.to_numpy()
+    return check_finite(X)
+
+
+def array_to_arrow(preds: np.ndarray) -> bytes:
+    pa = _pyarrow()
+    table = pa.table({"prediction": pa.array(preds)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
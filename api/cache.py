@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    LRU cache of predictions (or of per-row vectors such as attributions)
+    keyed on the 12-feature vector.
+
+    rows are canonicalized to float64 (so 10, 10.0 and -0.0/0.0 map to the
+    same key) and the raw bytes of the row are the key. entries optionally
+    expire after `ttl_s` seconds. the whole cache belongs to one model
+    version; `check_model` drops everything when the fingerprint changes.
+
+    args:
+    max_size: maximum number of cached rows, least recently used go first.
+    ttl_s: time to live of an entry in seconds, 0 disables expiry.
+    width: None caches one value per row; n caches a vector of n values.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl_s: float = 0.0, width: int = None):
+        self.max_size = max(1, int(max_size))
+        self.ttl_s = float(ttl_s or 0.0)
+        self.width = width
+        self._entries: OrderedDict = OrderedDict()
+        self.model_fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def canonicalize(features: np.ndarray) -> np.ndarray:
+        # + 0.0 turns -0.0 into 0.0
+        return np.ascontiguousarray(features, dtype=np.float64) + 0.0
+
+    def check_model(self, fingerprint) -> None:
+        """clear the cache when it was filled by a different model version."""
+        if fingerprint != self.model_fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_fingerprint = fingerprint
+
+    def lookup(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        return:
+        predictions (nan for misses) and the boolean miss mask.
+        """
+        X = self.canonicalize(features)
+        preds = np.full(len(X) if self.width is None else (len(X), self.width), np.nan)
+        missing = np.ones(len(X), dtype=bool)
+        now = time.monotonic()
+
+        for i, row in enumerate(X):
+            key = row.tobytes()
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            value, stored_at = entry
+            if self.ttl_s and now - stored_at > self.ttl_s:
+                del self._entries[key]
+                self.expirations += 1
+                continue
+            self._entries.move_to_end(key)
+            preds[i] = value
+            missing[i] = False
+
+        n_missing = int(missing.sum())
+        self.misses += n_missing
+        self.hits += len(X) - n_missing
+        return preds, missing
+
+    def store(self, features: np.ndarray, preds: np.ndarray) -> None:
+        now = time.monotonic()
+        for row, value in zip(self.canonicalize(features), preds):
+            key = row.tobytes()
+            self._entries[key] = (float(value) if self.width is None else np.array(value), now)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,531 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Union
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from api import binary
+from api.batcher import MicroBatcher
+from api.cache import PredictionCache
+from api.predictor import Predictor
+from api.request_log import RequestLog
+from api.workers import process_memory, serve, worker_count
+from src import registry
+from src.lookup_table import LookupTable, file_md5, header_path
+from src.monitoring import DriftMonitor, Profile
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import FEATURE_COLUMNS
+
+logger = get_logger("serving.log")
+
+
+class Student(BaseModel):
+    """one row of the form in frontend/main.py."""
+    StudentID: Optional[Union[str, int]] = None
+    Age: int
+    Gender: int
+    Ethnicity: int
+    ParentalEducation: int
+    StudyTimeWeekly: float
+    Absences: int
+    Tutoring: int
+    ParentalSupport: int
+    Extracurricular: int
+    Sports: int
+    Music: int
+    Volunteering: int
+
+
+def to_features(students: List[Student]) -> np.ndarray:
+    """stack students into the 12-column layout of features.npy."""
+    return np.array(
+        [[getattr(s, col) for col in FEATURE_COLUMNS] for s in students],
+        dtype=np.float64,
+    )
+
+
+state = {"predictor": None, "batcher": None, "cache": None, "table": None, "table_path": None,
+         "checked_at": 0.0, "check_interval": 5.0, "table_stamp": None, "table_checked_at": 0.0,
+         "table_check_interval": 5.0, "stream_chunk_rows": 65536,
+         "request_log": None, "monitor": None, "worker": None, "n_workers": 1, "preloaded": None,
+         "explain_enabled": True, "explanations": None}
+
+
+def table_stamp(table_path: str):
+    """mtime of the table's json header, which src.lookup_table writes last; None without one."""
+    try:
+        return os.stat(header_path(table_path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_lookup_table(table_path: str, predictor: Predictor):
+    """
+    open the precomputed UI grid table (src/lookup_table.py) for `predictor`.
+
+    the table is only used when it was built from the exact model file being
+    served; otherwise every request goes to the model.
+    """
+    state["table_stamp"] = table_stamp(table_path) if table_path else None
+    if not table_path or not os.path.exists(table_path) or not os.path.exists(header_path(table_path)):
+        logger.info("No lookup table found, serving every request from the model.")
+        return None
+    try:
+        table = LookupTable(table_path)
+        if table.model_md5 != file_md5(predictor.source_path):
+            logger.warning(f"Lookup table {table_path} was built for another model, not using it.")
+            return None
+        logger.info(f"Lookup table loaded: {table.header['n_cells']} cells.")
+        return table
+    except Exception as e:
+        logger.exception(f"Lookup table could not be loaded: {e}")
+        return None
+
+
+def predict_batch(features: np.ndarray) -> np.ndarray:
+    # looked up per batch so a reloaded model is picked up by the batcher.
+    return state["predictor"].predict(features)
+
+
+def refresh_lookup_table(now: float) -> None:
+    """
+    reopen the lookup table when its header changed on disk.
+
+    the lookup_table stage rebuilds it after evaluation activated a new
+    serving model, i.e. after the service already dropped the old table as
+    built for another model. checked every `serving.model_check_interval_s`
+    seconds, in pre-forked workers too.
+    """
+    if not state["table_path"] or state["predictor"] is None:
+        return
+    if now - state["table_checked_at"] < state["table_check_interval"]:
+        return
+    state["table_checked_at"] = now
+    if table_stamp(state["table_path"]) != state["table_stamp"]:
+        state["table"] = load_lookup_table(state["table_path"], state["predictor"])
+
+
+async def refresh_model(force: bool = False) -> None:
+    """
+    hot-swap the model when the registry's active version (or
+    models/model.joblib without a registry) changed.
+
+    checked at most every `serving.model_check_interval_s` seconds. the new
+    model is loaded off the event loop while the old one keeps serving, then
+    swapped in with one assignment, so no request is dropped or sees a mix;
+    batches already running finish on the old model. the prediction cache
+    is cleared whenever a new version is loaded.
+    """
+    now = time.monotonic()
+    refresh_lookup_table(now)
+    if not force and now - state["checked_at"] < state["check_interval"]:
+        return
+    state["checked_at"] = now
+
+    predictor = state["predictor"]
+    if not predictor.changed():
+        return
+    try:
+        state["predictor"] = await asyncio.get_running_loop().run_in_executor(None, predictor.reload)
+        logger.info(f"Model changed, now serving {state['predictor'].source_path}.")
+    except Exception as e:
+        # a half-written file; keep serving the old model and retry on the next check.
+        logger.exception(f"Model reload failed, keeping the previous model: {e}")
+        return
+    for cache in (state["cache"], state["explanations"]):
+        if cache is not None:
+            cache.check_model(state["predictor"].fingerprint)
+    if state["table_path"]:
+        state["table"] = load_lookup_table(state["table_path"], state["predictor"])
+
+
+def load_monitor(config: dict):
+    """live drift monitor against the reference profile training wrote, or None without one."""
+    path = config["paths"].get("reference_profile", "models/reference_profile.json")
+    if not os.path.exists(path):
+        logger.info(f"No reference profile at {path}, drift monitoring disabled.")
+        return None
+    settings = config.get("monitoring", {})
+    return DriftMonitor(
+        Profile.load(path),
+        psi_threshold=settings.get("psi_threshold", 0.25),
+        ks_threshold=settings.get("ks_threshold", 0.15),
+        min_rows=settings.get("min_rows", 1000),
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    config = load_config()
+    serving = config.get("serving", {})
+    model_path = config["paths"].get("model_path", "models/model.joblib")
+
+    try:
+        # a pre-forked worker (api/workers.py) serves the supervisor's model instead of loading its own.
+        state["predictor"] = state.pop("preloaded", None) or Predictor(
+            model_path,
+            backend=serving.get("backend", "sklearn"),
+            compiled_path=config["paths"].get("compiled_model_path"),
+            registry_dir=registry.serving_registry_dir(config["paths"]) if serving.get("registry", True) else None,
+        )
+    except Exception as e:
+        # keep serving /health so the frontend can show that the model is missing.
+        logger.exception(f"Prediction service started without a model: {e}")
+
+    # under the supervisor, model changes arrive as a rolling restart of the workers.
+    supervised = state["worker"] is not None
+    state["check_interval"] = float("inf") if supervised else serving.get("model_check_interval_s", 5)
+    state["table_check_interval"] = serving.get("model_check_interval_s", 5)
+    cache_settings = serving.get("cache", {})
+    if cache_settings.get("enabled", True):
+        state["cache"] = PredictionCache(
+            max_size=cache_settings.get("max_size", 100_000),
+            ttl_s=cache_settings.get("ttl_s", 0),
+        )
+    explain_settings = serving.get("explain", {})
+    state["explain_enabled"] = explain_settings.get("enabled", True)
+    if state["explain_enabled"] and explain_settings.get("cache_size", 10_000):
+        state["explanations"] = PredictionCache(max_size=explain_settings["cache_size"],
+                                                width=len(FEATURE_COLUMNS))
+
+    state["stream_chunk_rows"] = serving.get("stream_chunk_rows", 65536)
+    log_settings = dict(serving.get("request_log", {}))
+    if log_settings.pop("enabled", True):
+        state["monitor"] = load_monitor(config) if serving.get("drift_monitor", True) else None
+        on_batch = state["monitor"].observe if state["monitor"] is not None else None
+        log_path = log_settings.pop("path", "logs/requests.jsonl")
+        if supervised:
+            # one file per worker, e.g. logs/requests.0.jsonl; appends from several processes would interleave.
+            root, ext = os.path.splitext(log_path)
+            log_path = f"{root}.{state['worker']}{ext}"
+        state["request_log"] = RequestLog(log_path, on_batch=on_batch, **log_settings)
+        state["request_log"].start()
+    if serving.get("lookup_table", True):
+        state["table_path"] = config["paths"].get("lookup_table")
+
+    if state["predictor"] is not None:
+        for cache in (state["cache"], state["explanations"]):
+            if cache is not None:
+                cache.check_model(state["predictor"].fingerprint)
+        if state["table_path"]:
+            state["table"] = load_lookup_table(state["table_path"], state["predictor"])
+        state["batcher"] = MicroBatcher(
+            predict_batch,
+            max_batch_size=serving.get("max_batch_size", 64),
+            max_wait_ms=serving.get("max_wait_ms", 5),
+        )
+        await state["batcher"].start()
+
+    yield
+
+    if state["batcher"] is not None:
+        await state["batcher"].stop()
+    if state["request_log"] is not None:
+        state["request_log"].stop()
+
+
+app = FastAPI(title="Student Performance Prediction API", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    response = {"status": "ok", "model": state["predictor"] is not None}
+    if state["cache"] is not None:
+        response["cache"] = state["cache"].stats()
+    return response
+
+
+def scope() -> dict:
+    """
+    which process answered. caches, counters and the drift profile are kept
+    per worker, so with several workers each response covers only its own
+    share of the traffic.
+    """
+    return {"worker": state["worker"], "workers": state["n_workers"], "pid": os.getpid(),
+            "per_worker": state["n_workers"] > 1}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "scope": scope(),
+        "cache": state["cache"].stats() if state["cache"] is not None else None,
+        "explanation_cache": state["explanations"].stats() if state["explanations"] is not None else None,
+        "lookup_table": state["table"] is not None,
+        "request_log": state["request_log"].stats() if state["request_log"] is not None else None,
+        "drift_rows": state["monitor"].current.count if state["monitor"] is not None else None,
+        "memory": process_memory(),
+    }
+
+
+@app.get("/drift")
+async def drift():
+    """drift of the logged requests since start-up against the training reference."""
+    if state["monitor"] is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Drift monitoring not enabled")
+    return {**state["monitor"].report(), "scope": scope()}
+
+
+class Activation(BaseModel):
+    version: str
+
+
+@app.get("/model")
+async def model_info():
+    predictor = state["predictor"]
+    if predictor is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model not loaded")
+    versions = registry.list_versions(predictor.registry_dir) if predictor.registry_dir else []
+    return {"active": predictor.info(), "versions": versions}
+
+
+@app.post("/model/activate")
+async def activate(body: Activation):
+    """switch the registry to `version` (e.g. a rollback) and hot-swap to it."""
+    predictor = state["predictor"]
+    if predictor is None or not predictor.registry_dir:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Model registry not enabled")
+    try:
+        registry.activate_version(predictor.registry_dir, body.version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    await refresh_model(force=True)
+    return {"active": state["predictor"].info()}
+
+
+def log_request(endpoint: str, start: float, features: np.ndarray = None, preds: np.ndarray = None,
+                n_rows: int = None) -> None:
+    request_log = state["request_log"]
+    if request_log is not None:
+        request_log.record(endpoint, len(preds) if n_rows is None else n_rows,
+                           time.perf_counter() - start, features, preds)
+
+
+async def score(features: np.ndarray) -> np.ndarray:
+    """
+    predictions for a feature matrix.
+
+    in-grid rows are answered from the lookup table, the rest from the
+    prediction cache, and only what is left goes through the micro-batcher.
+    """
+    await refresh_model()
+    preds = np.full(len(features), np.nan)
+    todo = np.ones(len(features), dtype=bool)
+
+    table = state["table"]
+    if table is not None:
+        preds, todo = table.lookup(features)
+        if not todo.any():
+            return preds
+
+    cache = state["cache"]
+    if cache is not None:
+        cached, missing = cache.lookup(features[todo])
+        preds[todo] = cached
+        todo[todo] = missing
+        if not todo.any():
+            return preds
+
+    fingerprint = state["predictor"].fingerprint
+    new_preds = await state["batcher"].submit(features[todo])
+    preds[todo] = new_preds
+    # a reload while waiting may have cleared the cache; do not refill it with old predictions.
+    if cache is not None and cache.model_fingerprint == fingerprint:
+        cache.store(features[todo], new_preds)
+    return preds
+
+
+async def explain(features: np.ndarray) -> np.ndarray:
+    """
+    per-feature attributions (src/explain.py) for a feature matrix, from the
+    explanation cache where possible, the rest computed off the event loop.
+    """
+    predictor = state["predictor"]
+    cache = state["explanations"]
+    if cache is None:
+        out, todo = np.empty(features.shape), np.ones(len(features), dtype=bool)
+    else:
+        out, todo = cache.lookup(features)
+        if not todo.any():
+            return out
+
+    fingerprint = predictor.fingerprint
+    new = await asyncio.get_running_loop().run_in_executor(None, predictor.explain, features[todo])
+    out[todo] = new
+    if cache is not None and cache.model_fingerprint == fingerprint:
+        cache.store(features[todo], new)
+    return out
+
+
+@app.post("/predict", status_code=status.HTTP_201_CREATED)
+async def predict(payload: Union[Student, List[Student]], explain_features: bool = Query(False, alias="explain")):
+    """
+    predictions for one or more students; with ?explain=true also the
+    contribution of every feature to each prediction (they add up to the
+    prediction minus `expected_value`), unless explanations are disabled or
+    the model cannot be explained.
+    """
+    if state["batcher"] is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model not loaded")
+
+    students = payload if isinstance(payload, list) else [payload]
+    if not students:
+        return {"prediction": []}
+
+    start = time.perf_counter()
+    features = to_features(students)
+    preds = await score(features)
+    response = {"prediction": preds.tolist()}
+    if explain_features and state["explain_enabled"]:
+        try:
+            attributions = await explain(features)
+            response["expected_value"] = state["predictor"].explainer().expected_value
+            response["attributions"] = [dict(zip(FEATURE_COLUMNS, row)) for row in attributions.tolist()]
+        except ValueError as e:
+            # e.g. the histogram backend; the predictions are still good.
+            logger.warning(f"No attributions: {e}")
+    log_request("/predict", start, features, preds)
+    return response
+
+
+async def score_bulk(features: np.ndarray) -> np.ndarray:
+    """
+    predictions for an already batched matrix.
+
+    skips the per-row cache and the micro-batcher: in-grid rows come from the
+    lookup table and the rest goes to the model in one call off the event loop.
+    """
+    await refresh_model()
+    table = state["table"]
+    if table is None:
+        preds, todo = np.empty(len(features)), np.ones(len(features), dtype=bool)
+    else:
+        preds, todo = table.lookup(features)
+    if todo.any():
+        rows = features if todo.all() else features[todo]
+        predictor = state["predictor"]
+        preds[todo] = await asyncio.get_running_loop().run_in_executor(None, predictor.predict, rows)
+    return preds
+
+
+@app.post("/predict/bulk")
+async def predict_bulk(request: Request):
+    """
+    score a binary feature matrix: an .npy body (application/x-npy) or an
+    arrow ipc stream (application/vnd.apache.arrow.stream) with the 12
+    columns of features.npy. predictions come back in the same format.
+    """
+    if state["predictor"] is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model not loaded")
+
+    content_type = request.headers.get("content-type", binary.NPY_MEDIA_TYPE).split(";")[0].strip()
+    start = time.perf_counter()
+    body = await request.body()
+    try:
+        if content_type == binary.ARROW_MEDIA_TYPE:
+            features = binary.arrow_to_array(body)
+            preds = await score_bulk(features)
+            log_request("/predict/bulk", start, features, preds)
+            return Response(binary.array_to_arrow(preds), media_type=binary.ARROW_MEDIA_TYPE)
+        if content_type == binary.NPY_MEDIA_TYPE:
+            features = binary.npy_to_array(body)
+            preds = await score_bulk(features)
+            log_request("/predict/bulk", start, features, preds)
+            return Response(binary.array_to_npy(preds), media_type=binary.NPY_MEDIA_TYPE)
+    except binary.PayloadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                        detail=f"expected {binary.NPY_MEDIA_TYPE} or {binary.ARROW_MEDIA_TYPE}")
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """
+    streaming variant of /predict/bulk for .npy bodies.
+
+    the response is an .npy array of float64 predictions whose header is
+    sent as soon as the request header is read; rows are then scored in
+    chunks of `serving.stream_chunk_rows` while the upload is still
+    arriving and each chunk of predictions is sent right away. once the
+    header is out a truncated upload or a chunk with nan/inf can no longer
+    become a 400: the generator raises and the connection is aborted, so the
+    client never mistakes a partial body for a complete response.
+    """
+    if state["predictor"] is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Model not loaded")
+
+    start = time.perf_counter()
+    chunks = request.stream()
+    buffer = b""
+    # read until the npy header is complete so a bad payload still gets a 400.
+    try:
+        while True:
+            try:
+                shape, dtype, fortran_order, offset = binary.parse_npy_header(buffer)
+                break
+            except EOFError:
+                piece = await chunks.__anext__()
+                if not piece:
+                    raise binary.PayloadError("npy payload is truncated")
+                buffer += piece
+    except StopAsyncIteration:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="npy payload is truncated")
+    except binary.PayloadError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if fortran_order:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="streaming needs a C-ordered array")
+
+    n_rows, n_cols = shape
+    row_bytes = n_cols * dtype.itemsize
+    chunk_rows = state["stream_chunk_rows"]
+    pending = bytearray(buffer[offset:])
+
+    async def generate():
+        yield binary.npy_header((n_rows,))
+        done = 0
+        upload = chunks
+        while done < n_rows:
+            want = min(chunk_rows, n_rows - done) * row_bytes
+            while len(pending) < want:
+                try:
+                    pending.extend(await upload.__anext__())
+                except StopAsyncIteration:
+                    logger.error(f"stream upload ended after {done} of {n_rows} rows, aborting the response")
+                    raise binary.PayloadError(f"npy payload is truncated after {done} of {n_rows} rows")
+            rows = np.frombuffer(bytes(pending[:want]), dtype=dtype).reshape(-1, n_cols)
+            del pending[:want]
+            try:
+                binary.check_finite(rows)
+            except binary.PayloadError:
+                logger.error(f"stream rows {done}-{done + len(rows)} contain nan or inf, aborting the response")
+                raise
+            preds = await score_bulk(rows)
+            done += len(rows)
+            yield np.ascontiguousarray(preds, dtype=np.float64).tobytes()
+        log_request("/predict/stream", start, n_rows=n_rows)
+
+    return StreamingResponse(generate(), media_type=binary.NPY_MEDIA_TYPE)
+
+
+def main():
+    config = load_config()
+    serving = config.get("serving", {})
+    n_workers = worker_count(serving.get("workers", 1))
+    if n_workers > 1 and hasattr(os, "fork"):
+        serve(config, n_workers)
+        return
+
+    import uvicorn
+
+    uvicorn.run(app, host=serving.get("host", "0.0.0.0"), port=serving.get("port", 5000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import time
+
+import numpy as np
+
+from src import registry
+from src.compiled_model import CompiledEnsemble, compilable
+from src.explain import TreeExplainer
+from src.utils.logger import get_logger
+
+logger = get_logger("serving.log")
+
+BACKENDS = ("sklearn", "compiled")
+
+
+def file_fingerprint(path: str):
+    """(mtime_ns, size) of a model file, None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Predictor:
+    """
+    holds the trained model for the lifetime of the serving process.
+
+    args:
+    model_path: path of the joblib model written by src/train.py.
+    backend: "sklearn" calls model.predict, "compiled" scores with the
+        flattened tree arrays from src/compiled_model.py.
+    compiled_path: where the compiled arrays live; exported from the joblib
+        model on the fly when the file is missing.
+    registry_dir: when set, the active version of the model registry
+        (src/registry.py) is served instead of `model_path`; with the
+        compiled backend its arrays are memory-mapped, not unpickled.
+    """
+
+    def __init__(self, model_path: str, backend: str = "sklearn", compiled_path: str = None,
+                 registry_dir: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown serving backend: {backend}, expected one of {BACKENDS}")
+
+        self.requested_backend = backend
+        self.compiled_path = compiled_path
+        self.registry_dir = registry_dir
+        self.model_path = model_path
+        self.version = registry.current_version(registry_dir) if registry_dir else None
+
+        start = time.time()
+        if self.version is not None:
+            self.model = registry.load_version(registry_dir, self.version, prefer_arrays=(backend == "compiled"))
+            self.source_path = os.path.join(registry.version_dir(registry_dir, self.version),
+                                            registry.MODEL_FILENAME)
+            self.fingerprint = ("registry", self.version)
+        else:
+            if registry_dir:
+                logger.warning(f"Model registry {registry_dir} is empty, serving {model_path}.")
+            self.source_path = model_path
+            # the joblib file is the version of record; train.py rewrites it on every run.
+            self.fingerprint = file_fingerprint(model_path)
+            self.model = self._load_file(backend)
+
+        if backend == "compiled" and not isinstance(self.model, CompiledEnsemble):
+            if compilable(self.model):
+                self.model = CompiledEnsemble.from_model(self.model)
+            else:
+                # e.g. the histogram backend; its own predict is already vectorized.
+                logger.warning(f"{self.model.__class__.__name__} cannot be compiled, "
+                               f"serving it with the sklearn backend.")
+                backend = "sklearn"
+
+        self.backend = backend
+        self._explainer = None
+        self.load_seconds = time.time() - start
+        logger.info(f"Model loaded in {self.load_seconds:.3f} seconds: "
+                    f"{self.model.__class__.__name__} ({backend} backend"
+                    f"{', version ' + self.version if self.version else ''})")
+
+    def _load_file(self, backend: str):
+        if backend == "compiled" and self.compiled_path and os.path.exists(self.compiled_path):
+            return CompiledEnsemble.load(self.compiled_path)
+        if not os.path.exists(self.model_path):
+            logger.error(f"Model file not found at {self.model_path}")
+            raise FileNotFoundError(f"Model not found: {self.model_path}")
+        import joblib
+
+        return joblib.load(self.model_path)
+
+    def current_fingerprint(self):
+        if self.registry_dir:
+            version = registry.current_version(self.registry_dir)
+            if version is not None:
+                return ("registry", version)
+        return file_fingerprint(self.model_path)
+
+    def changed(self) -> bool:
+        """True when the active registry version (or the model file) is not the loaded one."""
+        return self.current_fingerprint() != self.fingerprint
+
+    def reload(self) -> "Predictor":
+        return Predictor(self.model_path, self.requested_backend, self.compiled_path, self.registry_dir)
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source_path,
+            "model_class": self.model.__class__.__name__,
+            "backend": self.backend,
+            "load_seconds": round(self.load_seconds, 4),
+        }
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        return self.model.predict(features)
+
+    def explainer(self) -> TreeExplainer:
+        """
+        TreeSHAP path arrays of the served model (src/explain.py), built on
+        first use: memory-mapped from the registry version, otherwise exported
+        from the loaded (or, behind a compiled export, the joblib) model.
+        raises ValueError for models that cannot be explained.
+        """
+        if self._explainer is None:
+            if self.version is not None:
+                self._explainer = registry.load_explainer(self.registry_dir, self.version)
+            elif isinstance(self.model, CompiledEnsemble):
+                import joblib
+
+                self._explainer = TreeExplainer.from_model(joblib.load(self.model_path))
+            else:
+                self._explainer = TreeExplainer.from_model(self.model)
+        return self._explainer
+
+    def explain(self, features: np.ndarray) -> np.ndarray:
+        return self.explainer().explain(features)
@@ -0,0 +1,212 @@
+import datetime
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from src.utils.logger import get_logger
+
+logger = get_logger("serving.log")
+
+
+class RequestLog:
+    """
+    append-only log of prediction requests, one json object per line.
+
+    `record` only puts a tuple on an in-memory queue; a background thread
+    turns records into json, writes them in batches (every `batch_size`
+    records or `flush_interval_ms`, whichever comes first) and rotates the
+    file when it grows past `max_bytes` or the day changes. rotated files
+    are gzipped and only the newest `keep` are kept.
+
+    the request path never waits on the disk: once the queue is more than
+    `sample_above` full only every `sample_every`-th record is kept, and
+    when it is completely full records are dropped. both are counted in
+    `stats()`.
+
+    a line looks like
+    {"ts": "...", "endpoint": "/predict", "n_rows": 1, "latency_ms": 0.8,
+     "features": [[...12 values in FEATURE_COLUMNS order...]], "prediction": [...]}
+    features and predictions are left out for requests of more than
+    `max_rows_per_record` rows (the bulk endpoints).
+
+    `on_batch`, when given, is called on the writer thread with every batch
+    of queued records (the tuples `record` puts on the queue), e.g. to feed
+    a src.monitoring.DriftMonitor without touching the request path.
+    """
+
+    def __init__(self, path: str, queue_size: int = 10_000, batch_size: int = 256,
+                 flush_interval_ms: float = 200, max_bytes: int = 50_000_000, rotate_daily: bool = True,
+                 compress: bool = True, keep: int = 14, sample_above: float = 0.5, sample_every: int = 10,
+                 max_rows_per_record: int = 64, on_batch=None):
+        self.path = path
+        self.on_batch = on_batch
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self.max_bytes = int(max_bytes or 0)
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.keep = int(keep or 0)
+        self.sample_every = max(1, int(sample_every))
+        self.max_rows_per_record = int(max_rows_per_record)
+
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._high_water = max(1, int(self._queue.maxsize * sample_above))
+        self._thread = None
+        self._file = None
+        self._day = None
+        self._skipped = 0
+
+        self.written = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.write_errors = 0
+        self._record_ns = 0
+        self._records = 0
+
+    def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="request-log", daemon=True)
+        self._thread.start()
+        logger.info(f"request log started: {self.path}")
+
+    def stop(self) -> None:
+        """flush whatever is queued and close the file."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"request log stopped: {self.written} written, {self.sampled_out} sampled out, "
+                    f"{self.dropped} dropped.")
+
+    def record(self, endpoint: str, n_rows: int, latency_s: float, features: np.ndarray = None,
+               preds: np.ndarray = None) -> None:
+        """queue one request. never blocks."""
+        start = time.perf_counter_ns()
+        if self._queue.qsize() >= self._high_water:
+            self._skipped += 1
+            if self._skipped % self.sample_every:
+                self.sampled_out += 1
+                self._count(start)
+                return
+        if n_rows > self.max_rows_per_record:
+            # do not keep large request bodies alive until the writer gets to them.
+            features = preds = None
+        try:
+            self._queue.put_nowait((time.time(), endpoint, n_rows, features, preds, latency_s))
+        except queue.Full:
+            self.dropped += 1
+        self._count(start)
+
+    def _count(self, start: int) -> None:
+        self._record_ns += time.perf_counter_ns() - start
+        self._records += 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+            "record_us": round(self._record_ns / max(self._records, 1) / 1000, 2),
+        }
+
+    def _line(self, item: tuple) -> str:
+        ts, endpoint, n_rows, features, preds, latency_s = item
+        record = {
+            "ts": datetime.datetime.fromtimestamp(ts).isoformat(timespec="milliseconds"),
+            "endpoint": endpoint,
+            "n_rows": n_rows,
+            "latency_ms": round(latency_s * 1000, 3),
+        }
+        if preds is not None:
+            record["features"] = np.asarray(features).tolist()
+            record["prediction"] = np.asarray(preds).tolist()
+        return json.dumps(record)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch:
+                self._write(batch)
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, batch: list) -> None:
+        try:
+            self._maybe_rotate()
+            self._file.write("".join(self._line(item) + "\n" for item in batch))
+            self._file.flush()
+            self.written += len(batch)
+        except Exception as e:
+            # losing log lines must never take the writer thread (or the service) down.
+            self.write_errors += 1
+            logger.exception(f"request log write failed, {len(batch)} records lost: {e}")
+        if self.on_batch is not None:
+            try:
+                self.on_batch(batch)
+            except Exception as e:
+                logger.exception(f"request log on_batch callback failed: {e}")
+
+    def _open(self) -> None:
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._day = datetime.date.today()
+
+    def _maybe_rotate(self) -> None:
+        too_big = self.max_bytes and self._file.tell() >= self.max_bytes
+        new_day = self.rotate_daily and datetime.date.today() != self._day
+        if not (too_big or new_day) or self._file.tell() == 0:
+            if new_day:
+                self._day = datetime.date.today()
+            return
+
+        self._file.close()
+        root, ext = os.path.splitext(self.path)
+        rotated = f"{root}-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+        os.replace(self.path, rotated)
+        self._open()
+        self.rotations += 1
+
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        self._prune(root, ext)
+
+    def _prune(self, root: str, ext: str) -> None:
+        if self.keep <= 0:
+            return
+        folder = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(root) + "-"
+        rotated = sorted(
+            name for name in os.listdir(folder)
+            if name.startswith(prefix) and (name.endswith(ext) or name.endswith(ext + ".gz"))
+        )
+        for name in rotated[:-self.keep]:
+            os.remove(os.path.join(folder, name))
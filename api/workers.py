@@ -0,0 +1,293 @@
+"""
+pre-fork multi-worker serving.
+
+python -m api.main              # with serving.workers != 1
+python -m api.workers [--workers N]
+
+one process scores at most one core's worth of predictions (the GIL), so
+throughput scales by running several. the supervisor loads the model once,
+binds the listening socket and forks the workers, which inherit both: the
+unpickled sklearn model (or the memory-mapped registry arrays of the
+compiled backend) is shared copy-on-write instead of being loaded N times,
+and a new worker is serving right after fork instead of after a cold start.
+gc.freeze() before forking keeps the garbage collector from writing to
+(and so un-sharing) the model's objects.
+
+the supervisor restarts workers that die (backing off when they crash right
+after start), and owns model hot-swaps: it polls the registry every
+`serving.model_check_interval_s`, loads the new version once and replaces
+the workers one at a time, each new worker starting before the old one is
+stopped gracefully. SIGHUP forces such a rolling restart, SIGTERM/SIGINT
+stop everything.
+
+`serving.workers`: 0 = one worker per available core.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import time
+
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+
+logger = get_logger("serving.log")
+
+MIN_UPTIME_S = 2.0  # a worker dying sooner than this counts as a crash loop
+MAX_BACKOFF_S = 30.0
+STOP_TIMEOUT_S = 30.0
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count(setting) -> int:
+    """`serving.workers` resolved to a process count (0 or None = one per core)."""
+    n = int(setting or 0)
+    return n if n > 0 else available_cores()
+
+
+def process_memory(pid="self") -> dict:
+    """rss, proportional (pss) and private memory of a process in MB, from /proc (linux only)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == "kB":
+                    values[fields[0].rstrip(":")] = int(fields[1])
+    except OSError:
+        return {}
+    private = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(values.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(values.get("Pss", 0) / 1024, 1),
+        "private_mb": round(private / 1024, 1),
+    }
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """
+    forks and looks after `n_workers` api processes sharing `sock`.
+
+    args:
+    config: the parsed config.yaml.
+    n_workers: number of worker processes.
+    sock: bound listening socket, inherited by every worker.
+    """
+
+    def __init__(self, config: dict, n_workers: int, sock: socket.socket):
+        self.config = config
+        self.serving = config.get("serving", {})
+        self.n_workers = n_workers
+        self.sock = sock
+        self.predictor = None
+        self.workers = {}  # pid -> slot
+        self.started = {}  # pid -> monotonic start time
+        self.retiring = set()  # pids replaced by a rolling restart
+        self.failures = [0] * n_workers
+        self.restart_at = {}  # slot -> monotonic time of a delayed restart
+        self._stopping = False
+        self._reload = False
+
+    def load_model(self) -> None:
+        from api.predictor import Predictor
+        from src import registry
+
+        paths = self.config["paths"]
+        try:
+            self.predictor = Predictor(
+                paths.get("model_path", "models/model.joblib"),
+                backend=self.serving.get("backend", "sklearn"),
+                compiled_path=paths.get("compiled_model_path"),
+                registry_dir=registry.serving_registry_dir(paths) if self.serving.get("registry", True) else None,
+            )
+        except Exception as e:
+            logger.exception(f"Supervisor started without a model: {e}")
+        if self.predictor is not None and self.serving.get("explain", {}).get("enabled", True):
+            try:
+                # built here so the workers share the attribution arrays as well.
+                self.predictor.explainer()
+            except ValueError as e:
+                logger.info(f"No explanations for this model: {e}")
+        self._freeze()
+
+    @staticmethod
+    def _freeze() -> None:
+        # everything allocated so far moves to the permanent generation, so the
+        # collector in the workers never touches (and copies) those pages.
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker(slot)
+        self.workers[pid] = slot
+        self.started[pid] = time.monotonic()
+        logger.info(f"worker {slot} started (pid {pid}).")
+        return pid
+
+    def _run_worker(self, slot: int) -> None:
+        code = 0
+        try:
+            import uvicorn
+
+            from api import main as service
+
+            for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signum, signal.SIG_DFL)
+            service.state["worker"] = slot
+            service.state["n_workers"] = self.n_workers
+            service.state["preloaded"] = self.predictor
+            server = uvicorn.Server(uvicorn.Config(service.app, log_level="warning"))
+            server.run(sockets=[self.sock])
+        except BaseException:
+            logger.exception(f"worker {slot} failed.")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _on_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self) -> None:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, self._on_signal)
+
+        self.load_model()
+        for slot in range(self.n_workers):
+            self.spawn(slot)
+        logger.info(f"Supervisor {os.getpid()} serving with {self.n_workers} workers.")
+
+        interval = self.serving.get("model_check_interval_s", 5)
+        checked_at = time.monotonic()
+        while not self._stopping:
+            time.sleep(0.2)
+            self._reap()
+            self._restart_due()
+            now = time.monotonic()
+            if self._reload or (interval and now - checked_at >= interval):
+                checked_at = now
+                self._check_model(force=self._reload)
+                self._reload = False
+        self.stop()
+
+    def _reap(self) -> None:
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self.workers.pop(pid, None)
+            uptime = time.monotonic() - self.started.pop(pid, time.monotonic())
+            if slot is None or pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if self._stopping:
+                continue
+            if uptime < MIN_UPTIME_S:
+                self.failures[slot] += 1
+            else:
+                self.failures[slot] = 0
+            delay = 0.0 if not self.failures[slot] else min(2.0 ** self.failures[slot], MAX_BACKOFF_S)
+            logger.warning(f"worker {slot} (pid {pid}) exited with status {status} after {uptime:.1f} s, "
+                           f"restarting in {delay:.0f} s.")
+            self.restart_at[slot] = time.monotonic() + delay
+
+    def _restart_due(self) -> None:
+        now = time.monotonic()
+        for slot, at in list(self.restart_at.items()):
+            if at <= now:
+                del self.restart_at[slot]
+                self.spawn(slot)
+
+    def _check_model(self, force: bool = False) -> None:
+        if self.predictor is None:
+            self.load_model()
+            if self.predictor is None:
+                return
+        elif force or self.predictor.changed():
+            gc.unfreeze()
+            try:
+                self.predictor = self.predictor.reload()
+            except Exception as e:
+                # a half-written file; workers keep the previous model, retried on the next check.
+                logger.exception(f"Model reload failed, keeping the previous model: {e}")
+                return
+            finally:
+                self._freeze()
+        else:
+            return
+        logger.info(f"Rolling restart onto {self.predictor.source_path}.")
+        self.rolling_restart()
+
+    def rolling_restart(self) -> None:
+        """start a fresh worker per slot, then let the old one finish its requests and exit."""
+        for pid, slot in list(self.workers.items()):
+            if pid in self.retiring:
+                continue
+            self.spawn(slot)
+            self.retiring.add(pid)
+            os.kill(pid, signal.SIGTERM)
+
+    def stop(self) -> None:
+        logger.info(f"Stopping {len(self.workers)} workers.")
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + STOP_TIMEOUT_S
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.workers.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.workers:
+            logger.warning(f"worker pid {pid} did not stop in time, killing it.")
+            os.kill(pid, signal.SIGKILL)
+        self.sock.close()
+
+
+def serve(config: dict, n_workers: int) -> None:
+    serving = config.get("serving", {})
+    sock = bind_socket(serving.get("host", "0.0.0.0"), serving.get("port", 5000))
+    Supervisor(config, n_workers, sock).run()
+
+
+def main():
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker prediction service.")
+    parser.add_argument("--workers", type=int, default=config.get("serving", {}).get("workers", 0),
+                        help="worker processes (0 = one per available core)")
+    args = parser.parse_args()
+    serve(config, worker_count(args.workers))
+
+
+if __name__ == "__main__":
+    main()
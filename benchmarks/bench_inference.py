@@ -0,0 +1,81 @@
+"""
+compare sklearn's GradientBoostingRegressor.predict with the compiled tree
+engine at batch sizes 1, 64 and 10k.
+
+run from the repo root after training:
+python -m benchmarks.bench_inference
+"""
+import argparse
+import json
+import time
+
+import joblib
+import numpy as np
+
+from src.compiled_model import CompiledEnsemble
+from src.utils.config import load_config
+
+BATCH_SIZES = (1, 64, 10_000)
+
+
+def time_call(fn, X: np.ndarray, min_time: float = 0.5) -> float:
+    """return the best per-call time in seconds over repeated runs."""
+    fn(X)  # warm up
+    best = float("inf")
+    elapsed = 0.0
+    runs = 0
+    while elapsed < min_time or runs < 3:
+        start = time.perf_counter()
+        fn(X)
+        took = time.perf_counter() - start
+        best = min(best, took)
+        elapsed += took
+        runs += 1
+    return best
+
+
+def run(model_path: str, feature_path: str, batch_sizes=BATCH_SIZES, seed: int = 42) -> list:
+    model = joblib.load(model_path)
+    compiled = CompiledEnsemble.from_model(model)
+    features = np.load(feature_path)
+    rng = np.random.default_rng(seed)
+
+    results = []
+    for n in batch_sizes:
+        X = features[rng.integers(0, len(features), size=n)]
+        max_diff = float(np.abs(model.predict(X) - compiled.predict(X)).max())
+        sk = time_call(model.predict, X)
+        cp = time_call(compiled.predict, X)
+        results.append({
+            "batch_size": n,
+            "sklearn_ms": round(sk * 1000, 4),
+            "compiled_ms": round(cp * 1000, 4),
+            "speedup": round(sk / cp, 2),
+            "max_abs_diff": max_diff,
+        })
+    return results
+
+
+def main():
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=config["paths"]["model_path"])
+    parser.add_argument("--features", default=config["paths"]["feature"])
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    args = parser.parse_args()
+
+    results = run(args.model, args.features)
+
+    print(f"{'batch':>8} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8} {'max diff':>10}")
+    for r in results:
+        print(f"{r['batch_size']:>8} {r['sklearn_ms']:>12.3f} {r['compiled_ms']:>12.3f} "
+              f"{r['speedup']:>8.2f} {r['max_abs_diff']:>10.2e}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
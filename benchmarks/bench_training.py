@@ -0,0 +1,59 @@
+"""
+fit time and hold-out MAE of both model backends on synthetic data.
+
+run from the repo root:
+python -m benchmarks.bench_training --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sklearn.metrics import mean_absolute_error
+
+from benchmarks.synthetic import synthetic_arrays
+from src.models import BACKENDS, build_model
+from src.utils.config import load_config
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def run(params: dict, sizes=SIZES, backends=tuple(BACKENDS), test_fraction: float = 0.2,
+        seed: int = 42) -> list:
+    results = []
+    for n in sizes:
+        X, y = synthetic_arrays(n, seed=seed)
+        split = int(n * (1 - test_fraction))
+        for backend in backends:
+            model = build_model(params, backend)
+            start = time.perf_counter()
+            model.fit(X[:split], y[:split])
+            fit_seconds = time.perf_counter() - start
+            mae = mean_absolute_error(y[split:], model.predict(X[split:]))
+            results.append({
+                "rows": n,
+                "backend": backend,
+                "fit_seconds": round(fit_seconds, 3),
+                "MAE": round(float(mae), 4),
+            })
+            print(f"{n:>9} {backend:>24} {fit_seconds:>10.2f}s  MAE {mae:.4f}", flush=True)
+    return results
+
+
+def main():
+    config = load_config()
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--output", default=None, help="optional json file for the results")
+    args = parser.parse_args()
+
+    results = run(config["parameters"], args.sizes, args.backends)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+load generator and latency profile of the prediction service.
+
+python -m benchmarks.load_test run --start --output load.json           # synthetic students
+python -m benchmarks.load_test run --replay logs/requests.jsonl --rate 300
+python -m benchmarks.load_test compare baseline.json load.json
+
+requests are sent over a pool of `--concurrency` keep-alive HTTP/1.1
+connections by a small asyncio client (no dependencies, localhost only).
+payloads are either replayed from a request log (api/request_log.py, same
+rows per request as logged, .jsonl or rotated .jsonl.gz) or synthesized
+uniformly inside the frontend's widget ranges (UI_GRID).
+
+closed loop (default): every connection sends its next request as soon as
+the previous answer arrived, which finds the saturation throughput.
+open loop (--rate): requests arrive as a Poisson process at `rate` per
+second whether or not earlier ones finished; latency is measured from the
+scheduled arrival, so time spent waiting for a free connection counts and a
+slow service is not hidden by the generator slowing down with it.
+
+the report (json) holds throughput, error counts, latency percentiles and a
+log-bucketed latency histogram; `compare` exits 1 when p50/p95/p99 grew by
+more than `load_test.latency_tolerance` or throughput dropped by more than
+`load_test.throughput_tolerance`.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from src.utils.config import load_config
+from src.utils.schema import FEATURE_COLUMNS, UI_GRID
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+CONTINUOUS = ("StudyTimeWeekly",)
+# histogram bucket bounds in ms: 4 per doubling from 50 us to ~105 s.
+BUCKETS_MS = 0.05 * 2.0 ** (np.arange(85) / 4)
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class HttpConnection:
+    """one keep-alive HTTP/1.1 connection; reopened after errors or `Connection: close`."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> tuple:
+        """
+        return:
+        (status code, response body).
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        try:
+            self.writer.write(head.encode() + body)
+            status_line = await self.reader.readline()
+            if not status_line:
+                raise ConnectionError("connection closed by the server")
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await self.reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                payload = await self._read_chunked()
+            else:
+                payload = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        except BaseException:
+            self.close()
+            raise
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    async def _read_chunked(self) -> bytes:
+        parts = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await self.reader.readline()
+                return b"".join(parts)
+            parts.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def synthetic_payloads(n: int, rows_per_request: int = 1, seed: int = 42) -> list:
+    """`n` (request body, rows) of random students inside the frontend's input ranges."""
+    rng = np.random.default_rng(seed)
+    bodies = []
+    for _ in range(n):
+        students = []
+        for _ in range(rows_per_request):
+            student = {}
+            for name in FEATURE_COLUMNS:
+                low, high = UI_GRID[name]
+                student[name] = (round(float(rng.uniform(low, high)), 2) if name in CONTINUOUS
+                                 else int(rng.integers(low, high + 1)))
+            students.append(student)
+        bodies.append((json.dumps(students[0] if rows_per_request == 1 else students).encode(), len(students)))
+    return bodies
+
+
+def replay_payloads(paths: list, limit: int = 100_000) -> list:
+    """(request body, rows) of the logged /predict requests, in log order, at most `limit`."""
+    bodies = []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "features" not in record or not record.get("endpoint", "/predict").startswith("/predict"):
+                    continue
+                students = [
+                    {name: (value if name in CONTINUOUS else int(value)) for name, value in zip(FEATURE_COLUMNS, row)}
+                    for row in record["features"]
+                ]
+                bodies.append((json.dumps(students[0] if len(students) == 1 else students).encode(), len(students)))
+                if len(bodies) >= limit:
+                    return bodies
+    if not bodies:
+        raise ValueError(f"no replayable /predict records with features in {paths}")
+    return bodies
+
+
+class LoadTest:
+    """
+    drives `path` on host:port with the given request bodies.
+
+    args:
+    concurrency: connections in the pool (and, closed loop, requests in flight).
+    rate: open-loop arrivals per second; None runs closed loop.
+    duration_s / max_requests: whichever ends the run first.
+    warmup: requests sent before measuring (they fill caches and connections).
+    """
+
+    def __init__(self, host: str, port: int, path: str, bodies: list, concurrency: int = 16,
+                 rate: float = None, duration_s: float = 10.0, max_requests: int = None,
+                 warmup: int = 50, seed: int = 42):
+        self.host, self.port, self.path = host, port, path
+        self.bodies = bodies
+        self.concurrency = max(1, int(concurrency))
+        self.rate = rate
+        self.duration_s = duration_s
+        self.max_requests = max_requests
+        self.warmup = warmup
+        self.rng = np.random.default_rng(seed)
+        self.latencies = []
+        self.rows = 0
+        self.errors = Counter()
+        self._next = 0
+        self._sent = 0
+
+    def _body(self) -> tuple:
+        body = self.bodies[self._next % len(self.bodies)]
+        self._next += 1
+        return body
+
+    async def _send(self, pool: asyncio.Queue, body: tuple, started: float, record: bool = True) -> None:
+        conn = await pool.get()
+        try:
+            status, _ = await conn.request("POST", self.path, body[0])
+            error = f"http {status}" if status >= 400 else None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            error = e.__class__.__name__
+        finally:
+            pool.put_nowait(conn)
+        if not record:
+            return
+        if error is None:
+            self.latencies.append(time.perf_counter() - started)
+            self.rows += body[1]
+        else:
+            self.errors[error] += 1
+
+    async def run(self) -> float:
+        """return: measured wall time in seconds."""
+        pool = asyncio.Queue()
+        for _ in range(self.concurrency):
+            pool.put_nowait(HttpConnection(self.host, self.port))
+
+        await asyncio.gather(*(self._send(pool, self._body(), 0.0, record=False) for _ in range(self.warmup)))
+        start = time.perf_counter()
+        deadline = start + self.duration_s
+        if self.rate:
+            await self._open_loop(pool, deadline)
+        else:
+            await asyncio.gather(*(self._closed_worker(pool, deadline) for _ in range(self.concurrency)))
+        seconds = time.perf_counter() - start
+
+        while not pool.empty():
+            pool.get_nowait().close()
+        return seconds
+
+    def _done(self, sent: int, now: float, deadline: float) -> bool:
+        return now >= deadline or (self.max_requests is not None and sent >= self.max_requests)
+
+    async def _closed_worker(self, pool: asyncio.Queue, deadline: float) -> None:
+        while not self._done(self._sent, time.perf_counter(), deadline):
+            self._sent += 1
+            await self._send(pool, self._body(), time.perf_counter())
+
+    async def _open_loop(self, pool: asyncio.Queue, deadline: float) -> None:
+        tasks = []
+        arrival = time.perf_counter()
+        sent = 0
+        while not self._done(sent, arrival, deadline):
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self._send(pool, self._body(), arrival)))
+            sent += 1
+            arrival += self.rng.exponential(1.0 / self.rate)
+        await asyncio.gather(*tasks)
+
+    def report(self, seconds: float) -> dict:
+        ms = np.array(self.latencies) * 1000
+        n_errors = sum(self.errors.values())
+        counts = np.bincount(np.searchsorted(BUCKETS_MS, ms), minlength=len(BUCKETS_MS) + 1) if len(ms) else []
+        return {
+            "requests": len(ms) + n_errors,
+            "ok": len(ms),
+            "errors": dict(self.errors),
+            "error_rate": round(n_errors / max(len(ms) + n_errors, 1), 5),
+            "seconds": round(seconds, 3),
+            "throughput_rps": round(len(ms) / seconds, 1) if seconds else 0.0,
+            "rows_per_s": round(self.rows / seconds, 1) if seconds else 0.0,
+            "latency_ms": {} if not len(ms) else {
+                "mean": round(float(ms.mean()), 3),
+                **{f"p{p:g}": round(float(np.percentile(ms, p)), 3) for p in PERCENTILES},
+                "max": round(float(ms.max()), 3),
+            },
+            # (upper bound in ms, count) of the non-empty buckets; the last bound is inf.
+            "histogram_ms": [
+                [round(float(BUCKETS_MS[i]), 3) if i < len(BUCKETS_MS) else None, int(c)]
+                for i, c in enumerate(counts) if c
+            ],
+        }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cores": os.cpu_count(),
+    }
+
+
+def fetch_json(host: str, port: int, path: str):
+    async def get():
+        conn = HttpConnection(host, port)
+        try:
+            status, body = await conn.request("GET", path)
+            return json.loads(body) if status == 200 else None
+        finally:
+            conn.close()
+
+    try:
+        return asyncio.run(get())
+    except (OSError, ValueError):
+        return None
+
+
+def start_service(host: str, port: int, timeout_s: float = 60.0) -> subprocess.Popen:
+    """`python -m api.main` (config.yaml decides port and workers), once /health reports a model."""
+    process = subprocess.Popen([sys.executable, "-m", "api.main"])
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"prediction service exited with status {process.returncode}")
+        health = fetch_json(host, port, "/health")
+        if health and health.get("model"):
+            return process
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"prediction service not healthy after {timeout_s:.0f} seconds")
+
+
+def compare(baseline: dict, current: dict, latency_tolerance: float = 0.2,
+            throughput_tolerance: float = 0.15) -> list:
+    """
+    return:
+    reasons for every latency percentile or throughput that regressed beyond the tolerances.
+    """
+    failures = []
+    print(f"{'metric':>16} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in ("p50", "p95", "p99"):
+        base, now = baseline["latency_ms"].get(key), current["latency_ms"].get(key)
+        if not base or now is None:
+            continue
+        change = now / base - 1
+        print(f"{key + ' ms':>16} {base:>12.3f} {now:>12.3f} {change:>+8.1%}")
+        if change > latency_tolerance:
+            failures.append(f"{key} latency {change:+.1%} (tolerance +{latency_tolerance:.0%})")
+    base, now = baseline["throughput_rps"], current["throughput_rps"]
+    change = now / base - 1 if base else 0.0
+    print(f"{'requests/s':>16} {base:>12.1f} {now:>12.1f} {change:>+8.1%}")
+    if change < -throughput_tolerance:
+        failures.append(f"throughput {change:+.1%} (tolerance -{throughput_tolerance:.0%})")
+    if current.get("error_rate", 0) > baseline.get("error_rate", 0):
+        failures.append(f"error rate {baseline.get('error_rate', 0)} -> {current['error_rate']}")
+    return failures
+
+
+def run(args, config: dict) -> dict:
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    if host not in LOCAL_HOSTS:
+        raise ValueError(f"load tests only run against localhost, not {host}")
+
+    if args.replay:
+        bodies = replay_payloads(args.replay)
+        source = {"replay": args.replay, "payloads": len(bodies)}
+    else:
+        bodies = synthetic_payloads(args.payloads, args.rows, args.seed)
+        source = {"synthetic": True, "payloads": len(bodies), "rows_per_request": args.rows}
+
+    service = start_service(host, port) if args.start else None
+    try:
+        test = LoadTest(host, port, args.path, bodies, concurrency=args.concurrency, rate=args.rate,
+                        duration_s=args.duration, max_requests=args.requests, warmup=args.warmup,
+                        seed=args.seed)
+        seconds = asyncio.run(test.run())
+        metrics = fetch_json(host, port, "/metrics")
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait(timeout=60)
+
+    report = {
+        "environment": environment(),
+        "settings": {
+            "url": args.url + args.path,
+            "mode": "open" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "warmup": args.warmup,
+            **source,
+        },
+        **test.report(seconds),
+        "service_metrics": metrics,
+    }
+    latency = report["latency_ms"]
+    print(f"{report['ok']} ok / {report['requests']} requests in {report['seconds']:.1f} s: "
+          f"{report['throughput_rps']:.1f} req/s, p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, "
+          f"p99 {latency.get('p99')} ms, errors {report['errors']}")
+    return report
+
+
+def main():
+    config = load_config()
+    settings = config.get("load_test", {})
+    serving = config.get("serving", {})
+
+    parser = argparse.ArgumentParser(description="Load test of the local prediction service.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run")
+    p.add_argument("--url", default=f"http://127.0.0.1:{serving.get('port', 5000)}")
+    p.add_argument("--path", default="/predict", help="e.g. /predict?explain=true")
+    p.add_argument("--start", action="store_true", help="start python -m api.main for the run")
+    p.add_argument("--replay", nargs="+", default=None, help="request log files to replay")
+    p.add_argument("--payloads", type=int, default=settings.get("payloads", 10_000),
+                   help="synthetic request bodies, cycled")
+    p.add_argument("--rows", type=int, default=settings.get("rows_per_request", 1),
+                   help="students per synthetic request")
+    p.add_argument("--concurrency", type=int, default=settings.get("concurrency", 16))
+    p.add_argument("--rate", type=float, default=None, help="open loop: arrivals per second")
+    p.add_argument("--duration", type=float, default=settings.get("duration_s", 10.0))
+    p.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    p.add_argument("--warmup", type=int, default=settings.get("warmup_requests", 50))
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--output", default=None, help="json file for the report")
+    c = sub.add_parser("compare")
+    c.add_argument("baseline")
+    c.add_argument("current")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        with open(args.current, "r") as f:
+            current = json.load(f)
+        failures = compare(baseline, current,
+                           latency_tolerance=settings.get("latency_tolerance", 0.2),
+                           throughput_tolerance=settings.get("throughput_tolerance", 0.15))
+        for reason in failures:
+            print(f"REGRESSION {reason}")
+        if failures:
+            sys.exit(1)
+        print("no regressions.")
+        return
+
+    report = run(args, config)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+benchmark suite with a regression gate.
+
+times src.preprocessing.preprocessing, src.train.train, src.evaluate.evaluate
+and single-row vs batched model.predict on synthetic students
+(benchmarks/synthetic.py) at several scales, and records throughput
+(rows/s) and peak memory growth of each. everything runs offline on cpu.
+
+run from the repo root:
+python -m benchmarks.suite run --output benchmarks/baseline.json
+python -m benchmarks.suite compare                # run now, compare to the baseline
+python -m benchmarks.suite compare --current results.json
+
+compare exits with status 1 when a benchmark's throughput dropped by more
+than `benchmarks.throughput_tolerance` or its memory grew by more than
+`benchmarks.memory_tolerance` (plus `memory_slack_mb`) against the baseline,
+or when a baseline benchmark is missing from the current run.
+
+memory is the peak resident set size reached during the timed call minus
+the resident set before it. on linux the peak is reset before every call
+(/proc/self/clear_refs); elsewhere only growth past the process's earlier
+peak is seen.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import sklearn
+
+from benchmarks.synthetic import synthetic_students
+from src.utils.config import load_config
+from src.utils.schema import FEATURE_COLUMNS, TARGET_COLUMN
+
+SCALES = (1_000, 10_000, 50_000)
+SINGLE_ROW_CALLS = 200
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _status_mb(field: str):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _rss_mb() -> float:
+    rss = _status_mb("VmRSS")
+    return rss if rss is not None else _peak_mb()
+
+
+def _peak_mb() -> float:
+    peak = _status_mb("VmHWM")
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak or 0.0
+
+
+def measure(fn, repeat: int = 1, setup=None, min_seconds: float = 0.5) -> dict:
+    """
+    best wall time of fn() and the peak memory growth over the calls.
+
+    fn runs at least `repeat` times and, when repeat > 1, until `min_seconds`
+    have been spent in it, so millisecond benchmarks are not one noisy
+    sample. with `setup`, every call is fn(setup()) and setup runs outside
+    the timing.
+    """
+    best = float("inf")
+    growth = 0.0
+    spent = 0.0
+    runs = 0
+    while runs < max(1, repeat) or (repeat > 1 and spent < min_seconds):
+        args = (setup(),) if setup is not None else ()
+        before = _rss_mb()
+        _reset_peak()
+        start = time.perf_counter()
+        fn(*args)
+        took = time.perf_counter() - start
+        best = min(best, took)
+        growth = max(growth, _peak_mb() - before)
+        spent += took
+        runs += 1
+    return {"seconds": best, "memory_mb": growth}
+
+
+def bench_preprocessing(n_rows: int, params: dict, repeat: int, seed: int) -> dict:
+    from src.preprocessing import preprocessing
+
+    df = synthetic_students(n_rows, seed)
+    # preprocessing drops columns in place, so every run gets its own copy.
+    return measure(preprocessing, repeat, setup=df.copy)
+
+
+def bench_train(n_rows: int, params: dict, repeat: int, seed: int) -> dict:
+    from src.train import train
+
+    features, labels = _arrays(n_rows, seed)
+    # only the fit: saving, the compiled export and registration are disk i/o.
+    return measure(lambda: train(features, labels, params, save=False), repeat)
+
+
+def bench_evaluate(n_rows: int, params: dict, repeat: int, seed: int) -> dict:
+    from src.evaluate import evaluate
+    from src.models import build_model
+
+    features, labels = _arrays(n_rows, seed)
+    candidates = {"model": build_model(params)}
+    return measure(lambda: evaluate(features, labels, candidates, n_splits=3, n_jobs=1), repeat)
+
+
+def bench_predict_single(n_rows: int, params: dict, repeat: int, seed: int) -> dict:
+    model, features = _fitted(n_rows, params, seed)
+    rows = features[:min(n_rows, SINGLE_ROW_CALLS)]
+
+    def run():
+        for i in range(len(rows)):
+            model.predict(rows[i:i + 1])
+
+    result = measure(run, repeat)
+    result["rows"] = len(rows)
+    return result
+
+
+def bench_predict_batch(n_rows: int, params: dict, repeat: int, seed: int) -> dict:
+    model, features = _fitted(n_rows, params, seed)
+    model.predict(features[:1])  # warm up
+    return measure(lambda: model.predict(features), repeat)
+
+
+def _arrays(n_rows: int, seed: int):
+    rows = synthetic_students(n_rows, seed)
+    return rows[FEATURE_COLUMNS].to_numpy(dtype=np.float32), rows[TARGET_COLUMN].to_numpy(dtype=np.float32)
+
+
+def _fitted(n_rows: int, params: dict, seed: int):
+    from src.models import build_model
+
+    features, labels = _arrays(n_rows, seed)
+    model = build_model(params)
+    model.fit(features, labels)
+    return model, features
+
+
+# name -> (function, how many timed runs: training and cv run once, the rest `repeat` times)
+BENCHMARKS = {
+    "preprocessing": (bench_preprocessing, None),
+    "train": (bench_train, 1),
+    "evaluate": (bench_evaluate, 1),
+    "predict_single": (bench_predict_single, None),
+    "predict_batch": (bench_predict_batch, None),
+}
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(params: dict, scales=SCALES, names=tuple(BENCHMARKS), repeat: int = 3, seed: int = 42) -> dict:
+    """
+    run every benchmark in `names` at every scale.
+
+    return:
+    {"environment": {...}, "results": {"<name>@<rows>": {"rows", "seconds",
+    "throughput", "memory_mb"}}}.
+    """
+    results = {}
+    for n_rows in scales:
+        for name in names:
+            fn, runs = BENCHMARKS[name]
+            result = fn(n_rows, params, runs or repeat, seed)
+            rows = result.pop("rows", n_rows)
+            results[f"{name}@{n_rows}"] = {
+                "rows": rows,
+                "seconds": round(result["seconds"], 4),
+                "throughput": round(rows / max(result["seconds"], 1e-9), 1),
+                "memory_mb": round(result["memory_mb"], 1),
+            }
+            r = results[f"{name}@{n_rows}"]
+            print(f"{name + '@' + str(n_rows):>24} {r['seconds']:>10.4f}s {r['throughput']:>14.1f} rows/s "
+                  f"{r['memory_mb']:>8.1f} MB", flush=True)
+    return {"environment": environment(), "results": results}
+
+
+def compare(baseline: dict, current: dict, throughput_tolerance: float = 0.15,
+            memory_tolerance: float = 0.25, memory_slack_mb: float = 5.0) -> list:
+    """
+    return:
+    (key, reason) for every benchmark that regressed beyond the tolerances,
+    or that is in the baseline but missing from the current run.
+    """
+    if baseline.get("environment") != current.get("environment"):
+        print(f"warning: environment differs from the baseline: {baseline.get('environment')} "
+              f"vs {current.get('environment')}")
+
+    failures = []
+    print(f"{'benchmark':>24} {'base rows/s':>14} {'rows/s':>14} {'change':>8} {'base MB':>8} {'MB':>8}")
+    for key, base in baseline["results"].items():
+        now = current["results"].get(key)
+        if now is None:
+            print(f"{key:>24} missing from the current run")
+            failures.append((key, "missing from the current run"))
+            continue
+        change = now["throughput"] / base["throughput"] - 1 if base["throughput"] else 0.0
+        print(f"{key:>24} {base['throughput']:>14.1f} {now['throughput']:>14.1f} {change:>+8.1%} "
+              f"{base['memory_mb']:>8.1f} {now['memory_mb']:>8.1f}")
+        if change < -throughput_tolerance:
+            failures.append((key, f"throughput {change:+.1%} (tolerance -{throughput_tolerance:.0%})"))
+        memory_limit = base["memory_mb"] * (1 + memory_tolerance) + memory_slack_mb
+        if now["memory_mb"] > memory_limit:
+            failures.append((key, f"memory {now['memory_mb']:.1f} MB > {memory_limit:.1f} MB"))
+    return failures
+
+
+def main():
+    config = load_config()
+    settings = config.get("benchmarks", {})
+
+    parser = argparse.ArgumentParser(description="Benchmark suite with a regression gate.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command in ("run", "compare"):
+        p = sub.add_parser(command)
+        p.add_argument("--scales", type=int, nargs="+", default=settings.get("scales", list(SCALES)))
+        p.add_argument("--benchmarks", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+        p.add_argument("--repeat", type=int, default=settings.get("repeat", 3))
+        p.add_argument("--output", default=None, help="json file for the results")
+    sub.choices["compare"].add_argument("--baseline", default=settings.get("baseline", "benchmarks/baseline.json"))
+    sub.choices["compare"].add_argument("--current", default=None,
+                                        help="results of an earlier run instead of running now")
+    args = parser.parse_args()
+
+    if args.command == "compare" and args.current:
+        with open(args.current, "r") as f:
+            current = json.load(f)
+    else:
+        current = run(config["parameters"], args.scales, args.benchmarks, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.command == "run":
+        return
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    failures = compare(
+        baseline, current,
+        throughput_tolerance=settings.get("throughput_tolerance", 0.15),
+        memory_tolerance=settings.get("memory_tolerance", 0.25),
+        memory_slack_mb=settings.get("memory_slack_mb", 5.0),
+    )
+    for key, reason in failures:
+        print(f"REGRESSION {key}: {reason}")
+    if failures:
+        sys.exit(1)
+    print("no regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+synthetic student data with the schema of the archive csv.
+
+rows are bootstrapped from `notebooks/archive/Student_performance_data _.csv`
+so the joint distribution (and therefore the learnable signal) is kept;
+the two continuous columns get a little gaussian jitter so large samples
+are not just exact duplicates.
+"""
+import numpy as np
+import pandas as pd
+
+from src.utils.schema import FEATURE_COLUMNS, TARGET_COLUMN
+
+ARCHIVE_CSV = "notebooks/archive/Student_performance_data _.csv"
+
+
+def synthetic_students(n_rows: int, seed: int = 42, source: str = ARCHIVE_CSV) -> pd.DataFrame:
+    """`n_rows` raw rows (all 15 csv columns) in the archive's layout."""
+    archive = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    rows = archive.iloc[rng.integers(0, len(archive), size=n_rows)].reset_index(drop=True)
+
+    rows["StudentID"] = np.arange(1, n_rows + 1) + 1000
+    rows["StudyTimeWeekly"] = np.clip(rows["StudyTimeWeekly"] + rng.normal(0, 0.25, n_rows), 0, 20)
+    rows["GPA"] = np.clip(rows["GPA"] + rng.normal(0, 0.02, n_rows), 0, 4)
+    return rows
+
+
+def synthetic_arrays(n_rows: int, seed: int = 42, source: str = ARCHIVE_CSV):
+    """features/labels arrays in the features.npy / labels.npy layout."""
+    rows = synthetic_students(n_rows, seed, source)
+    return rows[FEATURE_COLUMNS].to_numpy(dtype=np.float32), rows[TARGET_COLUMN].to_numpy(dtype=np.float32)
@@ -13,6 +13,20 @@ st.set_page_config(
 # API endpoint
 API_URL = "http://host.docker.internal:5000"
 
+# Advice for the features a student can act on, used when the model says they pull the prediction down.
+# Each entry also says when the advice applies: only if the student's current value can still move the
+# suggested way (no "tutoring could help" for a student who already has tutoring)
+RECOMMENDATIONS = {
+    "StudyTimeWeekly": ("📚 Consider increasing weekly study time for better performance", lambda v: v < 20),
+    "Absences": ("⚠️ High number of absences may impact performance - focus on attendance", lambda v: v > 10),
+    "Tutoring": ("👨‍🏫 Tutoring could help improve academic performance", lambda v: v == 0),
+    "ParentalSupport": ("👨‍👩‍👧 Increased parental support may positively impact performance", lambda v: v < 4),
+    "Extracurricular": ("🎯 Extracurricular activities can enhance overall development", lambda v: v == 0),
+    "Sports": ("⚽ Taking part in sports may help overall performance", lambda v: v == 0),
+    "Music": ("🎵 Music activities may help overall performance", lambda v: v == 0),
+    "Volunteering": ("🤝 Volunteering can enhance overall development", lambda v: v == 0),
+}
+
 # Custom CSS
 st.markdown("""
     <style>
@@ -201,6 +215,7 @@ if predict_button:
         with st.spinner("🔄 Making prediction..."):
             response = requests.post(
                 f"{API_URL}/predict",
+                params={"explain": "true"},
                 json=student_data,
                 headers={"Content-Type": "application/json"},
                 timeout=10
@@ -209,6 +224,7 @@ if predict_button:
         if response.status_code == 201:
             result = response.json()
             prediction = result.get("prediction", [])
+            attributions = (result.get("attributions") or [None])[0]
             
             st.success("✅ Prediction completed successfully!")
             
@@ -263,20 +279,31 @@ if predict_button:
             
             recommendations = []
             
-            if study_time < 10:
-                recommendations.append("📚 Consider increasing weekly study time for better performance")
+            if attributions:
+                # What the model actually learned: actionable features that lower this prediction, biggest first
+                negative = sorted(
+                    (value, name) for name, value in attributions.items()
+                    if name in RECOMMENDATIONS and value < 0 and RECOMMENDATIONS[name][1](student_data[name])
+                )
+                for value, name in negative[:3]:
+                    recommendations.append(f"{RECOMMENDATIONS[name][0]} ({value:+.2f})")
+            
+            else:
+                # Older API without attributions: fall back to fixed thresholds
+                if study_time < 10:
+                    recommendations.append("📚 Consider increasing weekly study time for better performance")
             
-            if absences > 10:
-                recommendations.append("⚠️ High number of absences may impact performance - focus on attendance")
+                if absences > 10:
+                    recommendations.append("⚠️ High number of absences may impact performance - focus on attendance")
             
-            if tutoring == 0 and prediction and prediction[0] < 60:
-                recommendations.append("👨‍🏫 Tutoring could help improve academic performance")
+                if tutoring == 0 and prediction and prediction[0] < 60:
+                    recommendations.append("👨‍🏫 Tutoring could help improve academic performance")
             
-            if extracurricular == 0:
-                recommendations.append("🎯 Extracurricular activities can enhance overall development")
+                if extracurricular == 0:
+                    recommendations.append("🎯 Extracurricular activities can enhance overall development")
             
-            if parental_support < 2:
-                recommendations.append("👨‍👩‍👧 Increased parental support may positively impact performance")
+                if parental_support < 2:
+                    recommendations.append("👨‍👩‍👧 Increased parental support may positively impact performance")
             
             if recommendations:
                 for rec in recommendations:
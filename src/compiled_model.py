@@ -0,0 +1,206 @@
+import os
+import time
+
+import numpy as np
+
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+
+logger = get_logger("train.log")
+
+# rows scored per pass; keeps the (rows x trees) index block cache resident.
+CHUNK_SIZE = 256
+# perfect-tree padding grows as 2**depth, so refuse very deep ensembles.
+MAX_DEPTH = 12
+
+
+def _float32_threshold(threshold: np.ndarray) -> np.ndarray:
+    """
+    round float64 thresholds down to float32.
+
+    sklearn compares float32 features against float64 thresholds. for a
+    float32 x, `x <= t` holds exactly when `x <= t32` where t32 is the
+    largest float32 not above t, so the comparison stays bit-identical.
+    """
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def compilable(model) -> bool:
+    """True for a GradientBoostingRegressor, the only model export_ensemble handles."""
+    # imported here so serving compiled arrays never loads sklearn.
+    from sklearn.ensemble import GradientBoostingRegressor
+
+    return isinstance(model, GradientBoostingRegressor)
+
+
+def export_ensemble(model) -> dict:
+    """
+    flatten a fitted GradientBoostingRegressor into contiguous arrays.
+
+    every tree is padded to a perfect binary tree of the ensemble depth and
+    stored in level order, so the children of node i are 2i+1 and 2i+2 and
+    need no left/right arrays. leaves above the full depth become pass-through
+    nodes (threshold +inf, always left) whose value is copied to every padded
+    leaf below them. the learning rate is folded into the leaf values.
+
+    args:
+    model: fitted GradientBoostingRegressor.
+
+    return:
+    dict of numpy arrays (feature, threshold, value, base, n_features).
+    """
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    depth = max(t.max_depth for t in trees)
+    if depth > MAX_DEPTH:
+        raise ValueError(f"tree depth {depth} is too deep to compile (max {MAX_DEPTH})")
+
+    n_internal, n_leaves = 2 ** depth - 1, 2 ** depth
+    feature = np.zeros((len(trees), n_internal), dtype=np.int32)
+    threshold = np.full((len(trees), n_internal), np.inf, dtype=np.float64)
+    value = np.zeros((len(trees), n_leaves), dtype=np.float64)
+
+    for i, tree in enumerate(trees):
+        # (sklearn node, position in the perfect tree, level)
+        stack = [(0, 0, 0)]
+        while stack:
+            node, pos, level = stack.pop()
+            if level == depth:
+                value[i, pos - n_internal] = tree.value[node, 0, 0] * model.learning_rate
+                continue
+            if tree.children_left[node] == -1:
+                stack.append((node, 2 * pos + 1, level + 1))
+                stack.append((node, 2 * pos + 2, level + 1))
+            else:
+                feature[i, pos] = tree.feature[node]
+                threshold[i, pos] = tree.threshold[node]
+                stack.append((tree.children_left[node], 2 * pos + 1, level + 1))
+                stack.append((tree.children_right[node], 2 * pos + 2, level + 1))
+
+    if model.init_ == "zero":
+        base = 0.0
+    else:
+        base = float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+
+    return {
+        "feature": feature,
+        "threshold": _float32_threshold(threshold),
+        "value": value,
+        "base": np.array(base, dtype=np.float64),
+        "n_features": np.array(model.n_features_in_, dtype=np.int32),
+    }
+
+
+class CompiledEnsemble:
+    """
+    vectorized evaluator for the arrays produced by `export_ensemble`.
+
+    a batch is scored level by level: every (row, tree) pair holds a node
+    index and all of them advance one level per step with flat numpy gathers.
+    """
+
+    def __init__(self, arrays: dict):
+        self.feature = np.ascontiguousarray(arrays["feature"], dtype=np.int32)
+        self.threshold = np.ascontiguousarray(arrays["threshold"], dtype=np.float32)
+        self.value = np.ascontiguousarray(arrays["value"], dtype=np.float64)
+        self.base = float(arrays["base"])
+        self.n_features = int(arrays["n_features"])
+
+        self.n_trees, n_internal = self.feature.shape
+        self.depth = int(np.log2(n_internal + 1))
+        # node index of a (row, tree) pair is tree_offset + position in tree.
+        self._tree_offset = (np.arange(self.n_trees, dtype=np.int32) * n_internal)[None, :]
+        self._step = 1 - self._tree_offset
+        self._leaf_offset = (np.arange(self.n_trees, dtype=np.int32) * (n_internal + 1)
+                             - self._tree_offset - n_internal)
+
+    @classmethod
+    def from_model(cls, model) -> "CompiledEnsemble":
+        return cls(export_ensemble(model))
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledEnsemble":
+        with np.load(path) as arrays:
+            return cls({key: arrays[key] for key in arrays.files})
+
+    def arrays(self) -> dict:
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "value": self.value,
+            "base": np.array(self.base),
+            "n_features": np.array(self.n_features),
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, **self.arrays())
+
+    def save_dir(self, path: str) -> None:
+        """one .npy per array, so `load_dir` can memory-map them (npz cannot be mapped)."""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays().items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+
+    @classmethod
+    def load_dir(cls, path: str, mmap: bool = True) -> "CompiledEnsemble":
+        """
+        load arrays written by `save_dir`.
+
+        with `mmap` the node tables stay in the page cache and are shared by
+        every process that maps the same files; loading takes milliseconds.
+        """
+        mode = "r" if mmap else None
+        names = ("feature", "threshold", "value", "base", "n_features")
+        return cls({name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in names})
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(features, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {X.shape}")
+
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_SIZE):
+            out[start:start + CHUNK_SIZE] = self._predict_chunk(X[start:start + CHUNK_SIZE])
+        return out
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows = len(X)
+        flat_x = X.ravel()
+        feature = self.feature.ravel()
+        threshold = self.threshold.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int32) * self.n_features)[:, None]
+
+        node = np.broadcast_to(self._tree_offset, (n_rows, self.n_trees)).copy()
+        for _ in range(self.depth):
+            go_right = flat_x.take(row_offset + feature.take(node)) > threshold.take(node)
+            # child of offset + i is offset + 2i + 1 (+1 when going right).
+            node *= 2
+            node += self._step
+            node += go_right
+
+        return self.base + self.value.ravel().take(node + self._leaf_offset).sum(axis=1)
+
+
+def main():
+    """export models/model.joblib to the compiled array format."""
+    import joblib
+
+    config = load_config()
+    model_path = config["paths"].get("model_path", "models/model.joblib")
+    compiled_path = config["paths"].get("compiled_model_path", "models/model_compiled.npz")
+
+    try:
+        model = joblib.load(model_path)
+        start = time.time()
+        CompiledEnsemble.from_model(model).save(compiled_path)
+        logger.info(f"Compiled model exported to {compiled_path} in {time.time() - start:.2f} seconds")
+    except Exception as e:
+        logger.exception(f"Model export failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
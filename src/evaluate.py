@@ -1,40 +1,24 @@
 import os
-import yaml
+import json
 import time
-import joblib
 import numpy as np
-from sklearn.model_selection import KFold, cross_val_score
-from sklearn.metrics import mean_absolute_error
+from concurrent.futures import ProcessPoolExecutor
+from src.utils import profiling
+from src.utils.config import load_config
 from src.utils.logger import get_logger
+from src.utils.storage import (attach_array, fold_indices, load_arrays, predict_rows,
+                               share_array, take_rows)
 
 # Initialize logger once
 logger = get_logger("evaluate.log")
 
-CONFIG_PATH = "config.yaml"
+# shared arrays of a pool worker, attached once by _init_worker.
+_worker_data = {}
 
 
-def load_config(path: str = CONFIG_PATH) -> dict:
-    """Load YAML configuration."""
-    try:
-        with open(path, "r") as f:
-            config = yaml.safe_load(f)
-        logger.info("Configuration loaded successfully.")
-        return config
-    except FileNotFoundError:
-        logger.error(f"Configuration file not found: {path}")
-        raise
-    except yaml.YAMLError as e:
-        logger.error(f"Error parsing YAML: {e}")
-        raise
-    except Exception as e:
-        logger.exception(f"Unexpected error while loading configuration: {e}")
-        raise
-
-
-def evaluate(features: np.ndarray, labels: np.ndarray) -> None:
-    """Evaluate the trained model using cross-validation."""
-    config = load_config()
-    model_path = config["paths"].get("model_path", "models/model.joblib")
+def load_model(model_path: str):
+    """Load the trained joblib model."""
+    import joblib
 
     if not os.path.exists(model_path):
         logger.error(f"Model file not found at {model_path}")
@@ -44,41 +28,324 @@ def evaluate(features: np.ndarray, labels: np.ndarray) -> None:
         logger.info("Loading trained model...")
         model = joblib.load(model_path)
         logger.info(f"Model loaded successfully: {model.__class__.__name__}")
+        return model
     except Exception as e:
         logger.exception(f"Error loading model: {e}")
         raise
 
+
+def score_fold(estimator, features: np.ndarray, labels: np.ndarray, train_idx: np.ndarray,
+               test_idx: np.ndarray, chunk_size: int = 100_000, staged: bool = False) -> dict:
+    """
+    Fit a fresh clone of `estimator` on one fold and score the held-out rows.
+
+    With `staged` the scores also hold "staged_mae", the held-out MAE after
+    each boosting iteration (from staged_predict), outside the timings.
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    model = clone(estimator)
+    model.fit(take_rows(features, train_idx, chunk_size), take_rows(labels, train_idx, chunk_size))
+    fit_seconds = time.perf_counter() - start
+
+    preds = predict_rows(model, features, test_idx, chunk_size)
+    y_true = take_rows(labels, test_idx, chunk_size)
+    scores = {
+        "mae": float(mean_absolute_error(y_true, preds)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, preds))),
+        "r2": float(r2_score(y_true, preds)),
+        "fit_seconds": round(fit_seconds, 4),
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        "cpu_seconds": round(time.process_time() - cpu_start, 4),
+    }
+    if staged and hasattr(model, "staged_predict"):
+        scores["staged_mae"] = staged_mae(model, features, labels, test_idx, chunk_size)
+    return scores
+
+
+def staged_mae(model, features: np.ndarray, labels: np.ndarray, rows: np.ndarray,
+               chunk_size: int = 100_000) -> np.ndarray:
+    """MAE of `model` on `rows` after each of its boosting iterations, one chunk of rows at a time."""
+    abs_error = None
+    for start in range(0, len(rows), chunk_size):
+        idx = rows[start:start + chunk_size]
+        X, y = take_rows(features, idx, chunk_size), take_rows(labels, idx, chunk_size)
+        sums = [np.abs(y - pred).sum() for pred in model.staged_predict(X)]
+        abs_error = np.array(sums) if abs_error is None else abs_error + sums
+    return abs_error / max(len(rows), 1)
+
+
+def _init_worker(feature_desc: dict, label_desc: dict) -> None:
+    # attach once per worker; the handles must outlive the arrays.
+    _worker_data["handles"] = []
+    for key, desc in (("features", feature_desc), ("labels", label_desc)):
+        shm, array = attach_array(desc)
+        _worker_data["handles"].append(shm)
+        _worker_data[key] = array
+
+
+def _score_task(task: tuple) -> dict:
+    estimator, train_idx, test_idx, chunk_size, staged = task
+    return score_fold(estimator, _worker_data["features"], _worker_data["labels"],
+                      train_idx, test_idx, chunk_size, staged)
+
+
+def score_folds(features: np.ndarray, labels: np.ndarray, tasks: list, n_jobs: int = 1,
+                chunk_size: int = 100_000, staged: list = None) -> list:
+    """
+    Run `score_fold` for every (estimator, train_idx, test_idx) task.
+
+    `staged` holds one flag per task: which tasks also compute "staged_mae".
+
+    With `n_jobs` > 1 the tasks run in a process pool. features and labels
+    are copied once into shared memory and every worker maps them read-only
+    instead of receiving a pickled copy per task.
+
+    return:
+    per-task scores, in task order.
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    staged = staged or [False] * len(tasks)
+
+    if n_jobs == 1 or len(tasks) <= 1:
+        return [score_fold(est, features, labels, tr, te, chunk_size, flag)
+                for (est, tr, te), flag in zip(tasks, staged)]
+
+    feature_shm, feature_desc = share_array(np.asarray(features))
+    label_shm, label_desc = share_array(np.asarray(labels))
     try:
-        logger.info("Starting model evaluation...")
-        cv = KFold(n_splits=5, shuffle=True, random_state=42)
-        scores = cross_val_score(model, features, labels, cv=cv, scoring="neg_mean_absolute_error")
-        mean_mae = -scores.mean()
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_worker,
+                                 initargs=(feature_desc, label_desc)) as pool:
+            return list(pool.map(_score_task, [(est, tr, te, chunk_size, flag)
+                                               for (est, tr, te), flag in zip(tasks, staged)]))
+    finally:
+        for shm in (feature_shm, label_shm):
+            shm.close()
+            shm.unlink()
+
+
+def _summary(folds: list) -> dict:
+    summary = {
+        "MAE": round(float(np.mean([f["mae"] for f in folds])), 4),
+        "RMSE": round(float(np.mean([f["rmse"] for f in folds])), 4),
+        "R2": round(float(np.mean([f["r2"] for f in folds])), 4),
+        "wall_seconds": round(float(sum(f["wall_seconds"] for f in folds)), 4),
+        "folds": folds,
+    }
+    curves = [f.pop("staged_mae") for f in folds if "staged_mae" in f]
+    if len(curves) == len(folds):
+        # cross-validated MAE per number of trees, not written to metrics.json.
+        summary["mae_curve"] = np.mean(curves, axis=0)
+    return summary
+
+
+def evaluate(features: np.ndarray, labels: np.ndarray, candidates: dict, n_splits: int = 5,
+             n_jobs: int = 1, chunk_size: int = 100_000, staged: str = None) -> dict:
+    """
+    Cross-validate every candidate model on the same folds.
 
-        logger.info("=" * 10 + " Model Evaluation " + "=" * 10)
-        logger.info(f"Cross-validation MAE: {mean_mae:.4f}")
+    Every (candidate, fold) pair is one task for `score_folds`, so with
+    `n_jobs` > 1 folds and candidates are spread over the process pool.
 
-        # Optionally store metrics for DVC tracking
-        # metrics = {"cross_val_MAE": round(mean_mae, 4)}
-        # with open("metrics.json", "w") as f:
-        #     yaml.safe_dump(metrics, f)
-        # logger.info("Evaluation metrics saved to metrics.json.")
+    args:
+    features, labels: arrays, possibly memory-mapped.
+    candidates: name -> unfitted (or fitted, it is cloned) estimator.
+    n_splits: number of KFold splits.
+    n_jobs: worker processes, -1 for all cores.
+    staged: name of the candidate whose "mae_curve" over its trees is also
+        computed (the served model); None for no curve.
 
+    return:
+    name -> {"MAE", "RMSE", "R2", "wall_seconds", "folds": [per-fold scores]}
+    (plus "mae_curve" for the `staged` candidate).
+    """
+    folds = list(fold_indices(len(labels), n_splits=n_splits, shuffle=True, random_state=42))
+    keys = [(name, i) for name in candidates for i in range(len(folds))]
+    tasks = [(candidates[name], *folds[i]) for name, i in keys]
+
+    try:
+        logger.info(f"Starting evaluation of {len(candidates)} candidate(s) x {len(folds)} folds "
+                    f"with n_jobs={n_jobs}...")
+        start = time.perf_counter()
+        scores = score_folds(features, labels, tasks, n_jobs=n_jobs, chunk_size=chunk_size,
+                             staged=[name == staged for name, _ in keys])
+        logger.info(f"Evaluation finished in {time.perf_counter() - start:.2f} seconds")
     except Exception as e:
         logger.exception(f"Unexpected error during evaluation: {e}")
         raise
 
+    results = {name: [] for name in candidates}
+    for (name, i), fold_scores in zip(keys, scores):
+        results[name].append(fold_scores)
+        # folds may run in pool workers; their own timings become the fold steps.
+        profiling.record(f"cv_fold.{name}.{i}", wall_s=fold_scores["wall_seconds"],
+                         fit_s=fold_scores["fit_seconds"], cpu_s=fold_scores["cpu_seconds"])
+
+    summary = {name: _summary(fold_scores) for name, fold_scores in results.items()}
+    logger.info("=" * 10 + " Model Evaluation " + "=" * 10)
+    for name, s in summary.items():
+        logger.info(f"{name}: Cross-validation MAE: {s['MAE']:.4f}, RMSE: {s['RMSE']:.4f}, R2: {s['R2']:.4f}")
+    return summary
+
+
+def build_candidates(model, candidate_params: dict) -> dict:
+    """The trained model plus one clone per parameter set in config evaluation.candidates."""
+    from sklearn.base import clone
+
+    candidates = {"model": model}
+    for name, params in (candidate_params or {}).items():
+        candidates[name] = clone(model).set_params(**params)
+    return candidates
+
+
+def select_n_trees(curve: np.ndarray, tolerance: float) -> int:
+    """Smallest number of trees whose MAE is within `tolerance` (relative) of the best one."""
+    best = float(np.min(curve))
+    return int(np.argmax(curve <= best * (1 + tolerance))) + 1
+
+
+def predict_latency(model, features: np.ndarray, batch_rows: int = 1000, repeat: int = 200) -> dict:
+    """Median wall time of model.predict for one row and for `batch_rows` rows, in ms."""
+    single = features[:1]
+    batch = features[:batch_rows]
+    model.predict(batch)
+
+    def median_ms(X, n):
+        times = []
+        for _ in range(n):
+            start = time.perf_counter()
+            model.predict(X)
+            times.append(time.perf_counter() - start)
+        return float(np.median(times)) * 1000
+
+    return {"single_row_ms": median_ms(single, repeat), f"batch_{len(batch)}_ms": median_ms(batch, max(repeat // 10, 5))}
+
+
+def serving_model(model, summary: dict, features: np.ndarray, tolerance: float = 0.01):
+    """
+    Truncate the trained model to the fewest trees within `tolerance` of its
+    best cross-validated MAE.
+
+    return:
+    the truncated model and its "serving_model" entry for metrics.json; the
+    model itself and None when the summary has no "mae_curve".
+    """
+    from src.models import n_trees, truncate
+
+    curve = summary.get("mae_curve")
+    if curve is None:
+        return model, None
+    full = n_trees(model)
+    n = select_n_trees(curve, tolerance)
+    truncated = truncate(model, n)
+
+    sample = take_rows(features, np.arange(min(len(features), 1000)))
+    full_latency = predict_latency(model, sample)
+    serving_latency = predict_latency(truncated, sample)
+    latency = {
+        name: {
+            "full": round(full_latency[name], 4),
+            "serving": round(serving_latency[name], 4),
+            "saved": round(full_latency[name] - serving_latency[name], 4),
+        }
+        for name in full_latency
+    }
+    info = {
+        "n_trees": n,
+        "full_n_trees": full,
+        "best_n_trees": int(np.argmin(curve)) + 1,
+        "tolerance": tolerance,
+        "cross_val_MAE": round(float(curve[n - 1]), 4),
+        "full_cross_val_MAE": round(float(curve[-1]), 4),
+        "MAE_change": round(float(curve[n - 1] - curve[-1]), 4),
+        "latency": latency,
+    }
+    logger.info(f"Serving model: {n} of {full} trees, cross-validation MAE {curve[n - 1]:.4f} "
+                f"({info['MAE_change']:+.4f}), single-row predict {latency['single_row_ms']['serving']:.3f} ms "
+                f"instead of {latency['single_row_ms']['full']:.3f} ms")
+    return truncated, info
+
+
+def save_serving_model(model, path: str, registry_dir: str = None, activate: bool = True,
+                       keep: int = 0) -> None:
+    """
+    Write the serving model (the evaluation stage's own output, apart from
+    the training stage's models/) and, with a registry, register it
+    (activated, so the service hot-swaps to it), keeping the newest `keep`
+    versions (0 = all).
+    """
+    import joblib
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Serving model saved to {path}.")
+    if registry_dir:
+        from src import registry
+
+        registry.register(path, registry_dir, activate=activate, keep=keep)
+
+
+def save_metrics(summary: dict, path: str, serving: dict = None) -> None:
+    """
+    Write the trained model's scores at top level and every candidate below it,
+    plus the truncated serving model's tree count, MAE change and latency.
+    """
+    main_scores = summary["model"]
+    metrics = {
+        "cross_val_MAE": main_scores["MAE"],
+        "cross_val_RMSE": main_scores["RMSE"],
+        "cross_val_R2": main_scores["R2"],
+        "candidates": {name: {key: value for key, value in scores.items() if key != "mae_curve"}
+                       for name, scores in summary.items()},
+    }
+    if serving is not None:
+        metrics["serving_model"] = serving
+    with open(path, "w") as f:
+        json.dump(metrics, f, indent=2)
+    logger.info(f"Evaluation metrics saved to {path}.")
+
 
 def main():
     try:
         config = load_config()
-        feature_path = config["paths"]["feature"]
-        label_path = config["paths"]["labels"]
-
-        X = np.load(feature_path)
-        y = np.load(label_path)
+        paths = config["paths"]
+        storage = config.get("storage", {})
+        settings = config.get("evaluation", {})
+        profiling.start("evaluation", config)
 
+        with profiling.step("load") as step:
+            X, y = load_arrays(paths["feature"], paths["labels"], mmap=storage.get("mmap", True))
+            step.add(features=X, labels=y)
         logger.info("Feature and label data loaded successfully.")
-        evaluate(X, y)
+
+        with profiling.step("load_model"):
+            model = load_model(paths.get("model_path", "models/model.joblib"))
+        candidates = build_candidates(model, settings.get("candidates"))
+
+        truncation = settings.get("truncation", {})
+        with profiling.step("cross_validation"):
+            summary = evaluate(
+                X, y, candidates,
+                n_splits=settings.get("n_splits", 5),
+                n_jobs=settings.get("n_jobs", 1),
+                chunk_size=storage.get("chunk_size", 100_000),
+                staged="model" if truncation.get("enabled", False) else None,
+            )
+        # without truncation the trained model itself is the serving model.
+        with profiling.step("truncation"):
+            served, serving = serving_model(model, summary["model"], X, truncation.get("tolerance", 0.01))
+        with profiling.step("save"):
+            save_serving_model(served, paths.get("serving_model_path", "models_serving/model.joblib"),
+                               paths.get("serving_registry_dir"), truncation.get("activate", True),
+                               config.get("registry", {}).get("keep", 0))
+            save_metrics(summary, paths.get("metrics_path", "metrics.json"), serving)
+        profiling.save()
     except Exception as e:
         logger.exception(f"Evaluation pipeline failed: {e}")
         raise
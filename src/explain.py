@@ -0,0 +1,300 @@
+"""
+per-prediction feature attributions straight from the boosted trees.
+
+python -m src.explain <input.csv> --output attributions.tbl
+
+path-dependent TreeSHAP: the contribution of every feature to one
+prediction, with the trees' own training cover standing in for the data
+distribution, so base value + attributions = prediction exactly.
+
+instead of recursing through every tree per row, `export_paths` flattens
+the ensemble into its root-to-leaf paths once. a path keeps one element per
+distinct feature it splits on: the interval (lower, upper] the feature must
+fall in to reach the leaf and the fraction of the training cover that gets
+there through those splits. for a row, a path is a game in which feature j
+either follows the row (1 if it is inside its interval, else 0) or the cover
+(its fraction z_j), and the Shapley values of such a product game follow
+from the polynomial prod_j (z_j + t * o_j). that polynomial is built for all
+(row, leaf) pairs at once with a handful of numpy operations per path
+position, so a batch is scored against every leaf of every tree in one
+vectorized pass. paths shorter than the longest are padded with elements
+that are always followed and never cut (z = o = 1); such a null player
+changes nobody's Shapley value.
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.compiled_model import _float32_threshold, compilable
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import FEATURE_COLUMNS, ID_COLUMN
+from src.utils.storage import create_table, set_table_rows
+
+logger = get_logger("explain.log")
+
+# rows per pass; the (rows x leaves x depth) coefficient block is the memory high-water mark.
+CHUNK_SIZE = 32
+ARRAY_NAMES = ("feature", "lower", "upper", "zero", "value", "expected_value", "n_features")
+
+
+def export_paths(model) -> dict:
+    """
+    root-to-leaf paths of a fitted GradientBoostingRegressor.
+
+    return:
+    dict of numpy arrays: feature, lower, upper, zero (n_leaves, depth) per
+    path element, value (n_leaves,) with the learning rate folded in,
+    expected_value (the cover-weighted mean prediction) and n_features.
+    """
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    depth = max(1, max(t.max_depth for t in trees))
+    features, lowers, uppers, zeros, values = [], [], [], [], []
+    expected = 0.0 if model.init_ == "zero" else float(
+        model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+
+    for tree in trees:
+        cover = tree.weighted_n_node_samples
+        threshold = _float32_threshold(tree.threshold)
+        # (node, {feature: [lower, upper, zero fraction]})
+        stack = [(0, {})]
+        while stack:
+            node, path = stack.pop()
+            left, right = tree.children_left[node], tree.children_right[node]
+            if left == -1:
+                value = tree.value[node, 0, 0] * model.learning_rate
+                expected += value * cover[node] / cover[0]
+                pad = depth - len(path)
+                features.append(list(path) + [0] * pad)
+                lowers.append([e[0] for e in path.values()] + [-np.inf] * pad)
+                uppers.append([e[1] for e in path.values()] + [np.inf] * pad)
+                zeros.append([e[2] for e in path.values()] + [1.0] * pad)
+                values.append(value)
+                continue
+            f, t = int(tree.feature[node]), threshold[node]
+            lower, upper, zero = path.get(f, (-np.inf, np.inf, 1.0))
+            # sklearn sends x <= threshold left.
+            stack.append((left, {**path, f: (lower, min(upper, t), zero * cover[left] / cover[node])}))
+            stack.append((right, {**path, f: (max(lower, t), upper, zero * cover[right] / cover[node])}))
+
+    return {
+        "feature": np.array(features, dtype=np.int32),
+        "lower": np.array(lowers, dtype=np.float32),
+        "upper": np.array(uppers, dtype=np.float32),
+        "zero": np.array(zeros, dtype=np.float64),
+        "value": np.array(values, dtype=np.float64),
+        "expected_value": np.array(expected, dtype=np.float64),
+        "n_features": np.array(model.n_features_in_, dtype=np.int32),
+    }
+
+
+class TreeExplainer:
+    """vectorized path-dependent TreeSHAP over the arrays of `export_paths`."""
+
+    def __init__(self, arrays: dict):
+        self.feature = np.ascontiguousarray(arrays["feature"], dtype=np.int32)
+        self.lower = np.ascontiguousarray(arrays["lower"], dtype=np.float32)
+        self.upper = np.ascontiguousarray(arrays["upper"], dtype=np.float32)
+        self.zero = np.ascontiguousarray(arrays["zero"], dtype=np.float64)
+        self.value = np.ascontiguousarray(arrays["value"], dtype=np.float64)
+        self.expected_value = float(arrays["expected_value"])
+        self.n_features = int(arrays["n_features"])
+
+        n_leaves, self.depth = self.feature.shape
+        d = self.depth
+        # Shapley weight of a coalition of k of the other d - 1 path elements.
+        fact = np.cumprod([1.0] + list(range(1, d + 1)))
+        self._weights = np.array([fact[k] * fact[d - k - 1] / fact[d] for k in range(d)])
+        # depth-major copies, so every step below works on contiguous (rows, leaves) planes.
+        self._feature_t = np.ascontiguousarray(self.feature.T)
+        self._lower_t = np.ascontiguousarray(self.lower.T)[:, None, :]
+        self._upper_t = np.ascontiguousarray(self.upper.T)[:, None, :]
+        self._zero_t = np.ascontiguousarray(self.zero.T)
+        # (depth, n_leaves, n_features) one-hot, so per-element contributions sum into features by matmul.
+        self._onehot = np.zeros((d, n_leaves, self.n_features))
+        for i in range(d):
+            self._onehot[i, np.arange(n_leaves), self.feature[:, i]] = 1.0
+
+    @classmethod
+    def from_model(cls, model) -> "TreeExplainer":
+        if not compilable(model):
+            raise ValueError(f"{model.__class__.__name__} cannot be explained, "
+                             f"only GradientBoostingRegressor trees are supported")
+        return cls(export_paths(model))
+
+    def arrays(self) -> dict:
+        return {
+            "feature": self.feature,
+            "lower": self.lower,
+            "upper": self.upper,
+            "zero": self.zero,
+            "value": self.value,
+            "expected_value": np.array(self.expected_value),
+            "n_features": np.array(self.n_features),
+        }
+
+    def save_dir(self, path: str) -> None:
+        """one .npy per array so `load_dir` can memory-map them, like CompiledEnsemble.save_dir."""
+        os.makedirs(path, exist_ok=True)
+        for name, array in self.arrays().items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+
+    @classmethod
+    def load_dir(cls, path: str, mmap: bool = True) -> "TreeExplainer":
+        mode = "r" if mmap else None
+        return cls({name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAY_NAMES})
+
+    def explain(self, features: np.ndarray) -> np.ndarray:
+        """
+        return:
+        (n, n_features) attributions; each row sums to prediction - expected_value.
+        """
+        X = np.ascontiguousarray(features, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {X.shape}")
+
+        out = np.empty((len(X), self.n_features), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_SIZE):
+            out[start:start + CHUNK_SIZE] = self._explain_chunk(X[start:start + CHUNK_SIZE])
+        return out
+
+    def _explain_chunk(self, X: np.ndarray) -> np.ndarray:
+        d = self.depth
+        x = X.T[self._feature_t]  # (depth, leaves, rows)
+        x = np.ascontiguousarray(x.transpose(0, 2, 1))  # (depth, rows, leaves)
+        one = ((x > self._lower_t) & (x <= self._upper_t)).astype(np.float64)
+        zero = self._zero_t
+
+        # coefficients of prod_j (z_j + t * o_j) in t, per (row, leaf): (d + 1, rows, leaves).
+        poly = np.zeros((d + 1,) + x.shape[1:])
+        poly[0] = 1.0
+        for j in range(d):
+            poly[1:j + 2] = poly[1:j + 2] * zero[j] + poly[:j + 1] * one[j]
+            poly[0] *= zero[j]
+
+        out = np.zeros((len(X), self.n_features))
+        weighted_poly = np.tensordot(self._weights, poly[:d], axes=1)
+        for i in range(d):
+            z, o = zero[i], one[i]
+            # the polynomial without element i, weighted by coalition size:
+            # o_i = 1 divides out (z_i + t) from the top coefficient down, o_i = 0 divides by z_i.
+            quotient = poly[d]
+            with_i = self._weights[d - 1] * quotient
+            for k in range(d - 1, 0, -1):
+                quotient = poly[k] - z * quotient
+                with_i += self._weights[k - 1] * quotient
+            weighted = np.where(o > 0, with_i, weighted_poly / z)
+            out += (self.value * (o - z) * weighted) @ self._onehot[i]
+        return out
+
+
+def load_explainer(config: dict) -> TreeExplainer:
+    """
+    explainer of the active registry version (its memory-mapped path arrays
+    when it has them), otherwise of paths.model_path.
+    """
+    import joblib
+
+    from src import registry
+
+    registry_dir = registry.serving_registry_dir(config["paths"])
+    version = registry.current_version(registry_dir) if registry_dir else None
+    if version is not None:
+        return registry.load_explainer(registry_dir, version)
+    return TreeExplainer.from_model(joblib.load(config["paths"].get("model_path", "models/model.joblib")))
+
+
+# explainer of a pool worker, loaded once by _init_worker.
+_worker_explainer = {}
+
+
+def _init_worker(config: dict) -> None:
+    _worker_explainer["explainer"] = load_explainer(config)
+
+
+def _explain_chunk(features: np.ndarray) -> np.ndarray:
+    return _worker_explainer["explainer"].explain(features)
+
+
+def explain_file(input_path: str, output_path: str, config: dict, chunk_size: int = 100_000,
+                 n_jobs: int = -1) -> int:
+    """
+    write StudentID plus one attribution column per feature for every row of
+    `input_path` into the column table `output_path`, chunk by chunk on a
+    process pool like src.predict_batch.predict_file.
+
+    return:
+    number of rows explained.
+    """
+    from src.predict_batch import _write_parquet, read_chunks
+    from src.preprocessing import count_rows
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    n_rows = count_rows(input_path)
+    logger.info(f"Explaining {n_rows} rows from {input_path} in chunks of {chunk_size} on {n_jobs} worker(s)...")
+
+    tmp_path = output_path + ".tmp"
+    table = create_table(tmp_path, {ID_COLUMN: "int64", **{name: "float64" for name in FEATURE_COLUMNS}}, n_rows)
+    written = 0
+
+    def drain(pending: list, keep: int) -> None:
+        nonlocal written
+        while len(pending) > keep:
+            ids, future = pending.pop(0)
+            n = len(ids)
+            table[ID_COLUMN][written:written + n] = ids
+            for name, column in zip(FEATURE_COLUMNS, future.result().T):
+                table[name][written:written + n] = column
+            written += n
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(config,)) as pool:
+        pending = []
+        for ids, features in read_chunks(input_path, chunk_size):
+            pending.append((ids, pool.submit(_explain_chunk, features)))
+            drain(pending, 2 * n_jobs)
+        drain(pending, 0)
+
+    for column in table.values():
+        column.flush()
+    del table
+    if written < n_rows:
+        set_table_rows(tmp_path, written)
+
+    if output_path.endswith(".parquet"):
+        _write_parquet(tmp_path, output_path)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, output_path)
+
+    seconds = time.time() - start
+    logger.info(f"{written} attributions written to {output_path} in {seconds:.2f} seconds "
+                f"({written / max(seconds, 1e-9):.0f} rows/s)")
+    return written
+
+
+def main():
+    config = load_config()
+    settings = config.get("batch_scoring", {})
+
+    parser = argparse.ArgumentParser(description="Per-feature attributions of a student csv.")
+    parser.add_argument("input", help="csv with StudentID and the 12 feature columns")
+    parser.add_argument("--output", default="attributions.tbl", help="column table (.tbl) or parquet (.parquet) output")
+    parser.add_argument("--chunk-size", type=int, default=settings.get("chunk_size", 100_000))
+    parser.add_argument("--n-jobs", type=int, default=settings.get("n_jobs", -1))
+    args = parser.parse_args()
+
+    try:
+        explain_file(args.input, args.output, config, args.chunk_size, args.n_jobs)
+    except Exception as e:
+        logger.exception(f"Explaining failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
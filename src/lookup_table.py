@@ -0,0 +1,162 @@
+"""
+precomputed predictions for every input the frontend form can produce.
+
+each widget in frontend/main.py is a bounded integer, so the whole UI input
+space is a finite grid (src.utils.schema.UI_GRID). a grid row is addressed by
+its mixed-radix index: column j contributes (value_j - low_j) * stride_j with
+the last column varying fastest. the table is one float32 .npy file opened
+memory-mapped by the serving layer, plus a json header with the grid and the
+md5 of the model it was built from.
+"""
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import FEATURE_COLUMNS, UI_GRID
+
+logger = get_logger("lookup_table.log")
+
+# grid rows decoded and scored per model.predict call.
+CHUNK_SIZE = 1_000_000
+
+
+def file_md5(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def mixed_radix_strides(radices: np.ndarray) -> np.ndarray:
+    """stride of each column, the last column varying fastest."""
+    strides = np.ones_like(radices)
+    strides[:-1] = np.cumprod(radices[::-1])[::-1][1:]
+    return strides
+
+
+def grid_layout(grid: dict = UI_GRID):
+    """lows, radices and strides of the grid in FEATURE_COLUMNS order."""
+    lows = np.array([grid[col][0] for col in FEATURE_COLUMNS], dtype=np.int64)
+    radices = np.array([grid[col][1] - grid[col][0] + 1 for col in FEATURE_COLUMNS], dtype=np.int64)
+    return lows, radices, mixed_radix_strides(radices)
+
+
+def decode(indices: np.ndarray, lows: np.ndarray, radices: np.ndarray) -> np.ndarray:
+    """grid rows (float32 feature matrix) for the given flat indices."""
+    X = np.empty((len(indices), len(radices)), dtype=np.float32)
+    rest = indices.astype(np.int64)
+    for j in range(len(radices) - 1, -1, -1):
+        X[:, j] = lows[j] + rest % radices[j]
+        rest //= radices[j]
+    return X
+
+
+def build_table(model, table_path: str, grid: dict = UI_GRID, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    score every grid row and write the table memory-mapped.
+
+    the table is built under a temporary name and moved into place, so
+    services with the old table memory-mapped never read a half-written one.
+
+    return:
+    the json header (grid, size and timing).
+    """
+    lows, radices, strides = grid_layout(grid)
+    n_cells = int(np.prod(radices))
+    os.makedirs(os.path.dirname(table_path) or ".", exist_ok=True)
+
+    start = time.time()
+    tmp_path = table_path + ".tmp"
+    table = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_cells,))
+    for begin in range(0, n_cells, chunk_size):
+        indices = np.arange(begin, min(begin + chunk_size, n_cells), dtype=np.int64)
+        table[begin:begin + len(indices)] = model.predict(decode(indices, lows, radices))
+    table.flush()
+    del table
+    os.replace(tmp_path, table_path)
+    build_seconds = time.time() - start
+
+    return {
+        "columns": FEATURE_COLUMNS,
+        "lows": lows.tolist(),
+        "radices": radices.tolist(),
+        "n_cells": n_cells,
+        "bytes": os.path.getsize(table_path),
+        "build_seconds": round(build_seconds, 2),
+    }
+
+
+def header_path(table_path: str) -> str:
+    return os.path.splitext(table_path)[0] + ".json"
+
+
+class LookupTable:
+    """
+    O(1) predictions for in-grid rows.
+
+    args:
+    table_path: .npy file written by `build_table`.
+    """
+
+    def __init__(self, table_path: str):
+        with open(header_path(table_path), "r") as f:
+            self.header = json.load(f)
+        self.table = np.load(table_path, mmap_mode="r")
+        self.lows = np.array(self.header["lows"], dtype=np.int64)
+        self.radices = np.array(self.header["radices"], dtype=np.int64)
+        self.highs = self.lows + self.radices - 1
+        self.strides = mixed_radix_strides(self.radices)
+        self.model_md5 = self.header.get("model_md5")
+
+    def lookup(self, features: np.ndarray):
+        """
+        return:
+        predictions (nan outside the grid) and the boolean miss mask.
+        """
+        X = np.asarray(features, dtype=np.float64)
+        in_grid = np.all((X == np.round(X)) & (X >= self.lows) & (X <= self.highs), axis=1)
+        preds = np.full(len(X), np.nan)
+        if in_grid.any():
+            indices = (X[in_grid].astype(np.int64) - self.lows) @ self.strides
+            preds[in_grid] = self.table[indices]
+        return preds, ~in_grid
+
+
+def main():
+    import joblib
+
+    config = load_config()
+    model_path = config["paths"].get("model_path", "models/model.joblib")
+    if config.get("serving", {}).get("registry", True):
+        from src import registry
+
+        # built for the model the service loads, normally the serving model src.evaluate registers.
+        registry_dir = registry.serving_registry_dir(config["paths"])
+        version = registry.current_version(registry_dir) if registry_dir else None
+        if version is not None:
+            model_path = os.path.join(registry.version_dir(registry_dir, version), registry.MODEL_FILENAME)
+    table_path = config["paths"].get("lookup_table", "lookup/grid.npy")
+
+    try:
+        model = joblib.load(model_path)
+        logger.info(f"Building lookup table for {model.__class__.__name__} from {model_path}...")
+        header = build_table(model, table_path)
+        header["model_md5"] = file_md5(model_path)
+        # written last: the service reopens the table when the header changes.
+        tmp_path = header_path(table_path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_path, header_path(table_path))
+        logger.info(f"Lookup table saved to {table_path}: {header['n_cells']} cells, "
+                    f"{header['bytes'] / 1e6:.1f} MB, built in {header['build_seconds']:.2f} seconds")
+    except Exception as e:
+        logger.exception(f"Lookup table build failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+model backends selectable with `model.backend` in config.yaml.
+
+the `parameters` block is written for GradientBoostingRegressor; for the
+histogram backend it is translated by `map_params`. sklearn.ensemble is
+only imported once a model is built.
+"""
+from src.utils.logger import get_logger
+
+logger = get_logger("train.log")
+
+# backend name -> sklearn.ensemble class name.
+BACKENDS = {
+    "gradient_boosting": "GradientBoostingRegressor",
+    "hist_gradient_boosting": "HistGradientBoostingRegressor",
+}
+DEFAULT_BACKEND = "gradient_boosting"
+
+# GradientBoostingRegressor name -> HistGradientBoostingRegressor name.
+HIST_PARAM_NAMES = {
+    "n_estimators": "max_iter",
+    "learning_rate": "learning_rate",
+    "max_depth": "max_depth",
+    "random_state": "random_state",
+    "min_samples_leaf": "min_samples_leaf",
+    "loss": "loss",
+}
+
+
+def map_params(params: dict, backend: str = DEFAULT_BACKEND) -> dict:
+    """
+    translate the `parameters` block for `backend`.
+
+    for the histogram backend, max_depth also caps max_leaf_nodes at
+    2**max_depth (the exact backend's leaf budget) and early stopping is off
+    so max_iter trees are always built, like n_estimators. parameters
+    without a histogram equivalent (subsample) are dropped with a log line.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}, expected one of {list(BACKENDS)}")
+    if backend == "gradient_boosting":
+        return dict(params)
+
+    mapped = {"early_stopping": False}
+    for name, value in params.items():
+        if name in HIST_PARAM_NAMES:
+            mapped[HIST_PARAM_NAMES[name]] = value
+        else:
+            logger.info(f"parameter {name}={value} has no {backend} equivalent, ignored.")
+    if mapped.get("max_depth"):
+        mapped["max_leaf_nodes"] = 2 ** mapped["max_depth"]
+    return mapped
+
+
+def build_model(params: dict, backend: str = DEFAULT_BACKEND):
+    """unfitted regressor of `backend` configured from the `parameters` block."""
+    from sklearn import ensemble
+
+    params = map_params(params, backend)
+    return getattr(ensemble, BACKENDS[backend])(**params)
+
+
+def n_trees(model) -> int:
+    """number of boosting iterations a fitted model holds."""
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    if isinstance(model, HistGradientBoostingRegressor):
+        return int(model.n_iter_)
+    return int(model.n_estimators_)
+
+
+def set_n_trees(model, n: int, warm_start: bool = False) -> None:
+    """set the iteration budget of either backend (optionally keeping fitted trees)."""
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    if isinstance(model, HistGradientBoostingRegressor):
+        model.set_params(max_iter=n, warm_start=warm_start)
+    else:
+        model.set_params(n_estimators=n, warm_start=warm_start)
+
+
+def truncate(model, n: int):
+    """
+    model that keeps only the first `n` boosting iterations of a fitted model.
+
+    a shallow copy with freshly sliced tree and score lists that shares the
+    fitted trees, so the same model and `n` always pickle to the same bytes
+    (a deepcopy does not). when nothing is cut the model itself is returned.
+    """
+    import copy
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    n = min(int(n), n_trees(model))
+    if n == n_trees(model):
+        return model
+    truncated = copy.copy(model)
+    if isinstance(model, HistGradientBoostingRegressor):
+        truncated._predictors = truncated._predictors[:n]
+        truncated.max_iter = n
+        # derived from _predictors in recent sklearn, a plain attribute in older ones.
+        if not isinstance(getattr(type(truncated), "n_iter_", None), property):
+            truncated.n_iter_ = n
+        # one score per iteration plus the initial one, when scoring was on.
+        for name in ("train_score_", "validation_score_"):
+            scores = getattr(truncated, name, None)
+            if scores is not None and len(scores):
+                setattr(truncated, name, scores[:n + 1])
+        return truncated
+
+    truncated.estimators_ = truncated.estimators_[:n]
+    truncated.n_estimators = n
+    truncated.n_estimators_ = n
+    truncated.train_score_ = truncated.train_score_[:n]
+    if hasattr(truncated, "oob_improvement_"):
+        truncated.oob_improvement_ = truncated.oob_improvement_[:n]
+        truncated.oob_scores_ = truncated.oob_scores_[:n]
+        truncated.oob_score_ = truncated.oob_scores_[-1]
+    return truncated
@@ -0,0 +1,312 @@
+"""
+streaming drift statistics for served requests.
+
+a Profile summarises a stream of feature rows (and predictions) in fixed
+size state: per-feature running mean/variance (Welford, merged batch by
+batch), a fixed-bin histogram per feature (one bin per value for the
+categorical columns and the integer-valued ones, 1-hour bins for
+StudyTimeWeekly, all over the frontend's input ranges plus an underflow and
+an overflow bin) and a histogram of predicted GPA. memory does not depend
+on how many rows went in.
+
+training stores the profile of the training data (and of the model's
+predictions on it) next to the model; `drift_report` compares a live profile
+with it (PSI and a binned KS statistic per feature, mean shift in reference
+standard deviations) and says whether retraining is warranted.
+
+feed it from the request log:
+python -m src.monitoring logs/requests.jsonl [rotated .jsonl.gz files ...]
+
+or live: with `serving.drift_monitor` the api updates a DriftMonitor from
+the request log's writer thread and serves the report at GET /drift.
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+
+import numpy as np
+
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import FEATURE_COLUMNS, TARGET_COLUMN, UI_GRID
+
+logger = get_logger("monitoring.log")
+
+CONTINUOUS_BINS = {"StudyTimeWeekly": 20, TARGET_COLUMN: 40}
+PREDICTION_RANGE = (0.0, 4.0)
+# floor of a bin proportion in the PSI, so an empty bin does not give log(0).
+PSI_EPSILON = 1e-4
+
+
+def _closed_linspace(low: float, high: float, n_bins: int) -> np.ndarray:
+    edges = np.linspace(low, high, n_bins + 1)
+    # the top value (e.g. 20 hours) belongs to the last bin, not to the overflow bin.
+    edges[-1] = np.nextafter(high, np.inf)
+    return edges
+
+
+def default_edges() -> dict:
+    """bin edges per feature and for the prediction, from the ranges of the frontend widgets."""
+    edges = {}
+    for name in FEATURE_COLUMNS:
+        low, high = UI_GRID[name]
+        if name in CONTINUOUS_BINS:
+            edges[name] = _closed_linspace(low, high, CONTINUOUS_BINS[name])
+        else:
+            edges[name] = np.arange(low, high + 2, dtype=np.float64) - 0.5
+    edges["prediction"] = _closed_linspace(*PREDICTION_RANGE, CONTINUOUS_BINS[TARGET_COLUMN])
+    return edges
+
+
+def _bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    # index 0 is below the first edge, len(edges) at or above the last one.
+    return np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+
+
+class Profile:
+    """
+    running summary of feature rows and predictions.
+
+    args:
+    edges: name -> bin edges for every feature and "prediction"
+        (default_edges() when omitted).
+    """
+
+    def __init__(self, edges: dict = None):
+        self.edges = edges or default_edges()
+        n = len(FEATURE_COLUMNS)
+        self.count = 0
+        self.mean = np.zeros(n)
+        self.m2 = np.zeros(n)
+        self.pred_count = 0
+        self.pred_mean = 0.0
+        self.pred_m2 = 0.0
+        self.hist = {name: np.zeros(len(e) + 1, dtype=np.int64) for name, e in self.edges.items()}
+
+    @staticmethod
+    def _merge(count, mean, m2, values: np.ndarray):
+        # Chan et al.: combine the running moments with the moments of a whole batch.
+        n = len(values)
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        total = count + n
+        delta = batch_mean - mean
+        mean = mean + delta * (n / total)
+        m2 = m2 + batch_m2 + delta ** 2 * (count * n / total)
+        return total, mean, m2
+
+    def update(self, features: np.ndarray = None, preds: np.ndarray = None) -> None:
+        """add a batch of feature rows (n, 12) and/or predictions (n,)."""
+        if features is not None and len(features):
+            X = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+            self.count, self.mean, self.m2 = self._merge(self.count, self.mean, self.m2, X)
+            for j, name in enumerate(FEATURE_COLUMNS):
+                self.hist[name] += _bin_counts(X[:, j], self.edges[name])
+        if preds is not None and len(preds):
+            p = np.asarray(preds, dtype=np.float64).ravel()
+            self.pred_count, self.pred_mean, self.pred_m2 = self._merge(
+                self.pred_count, self.pred_mean, self.pred_m2, p)
+            self.hist["prediction"] += _bin_counts(p, self.edges["prediction"])
+
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / max(self.count, 1))
+
+    def to_dict(self) -> dict:
+        return {
+            "features": FEATURE_COLUMNS,
+            "count": int(self.count),
+            "mean": np.asarray(self.mean).tolist(),
+            "m2": np.asarray(self.m2).tolist(),
+            "pred_count": int(self.pred_count),
+            "pred_mean": float(self.pred_mean),
+            "pred_m2": float(self.pred_m2),
+            "edges": {name: e.tolist() for name, e in self.edges.items()},
+            "hist": {name: h.tolist() for name, h in self.hist.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Profile":
+        if data["features"] != FEATURE_COLUMNS:
+            raise ValueError(f"profile was built for columns {data['features']}")
+        profile = cls({name: np.array(e) for name, e in data["edges"].items()})
+        profile.count = data["count"]
+        profile.mean = np.array(data["mean"])
+        profile.m2 = np.array(data["m2"])
+        profile.pred_count = data["pred_count"]
+        profile.pred_mean = data["pred_mean"]
+        profile.pred_m2 = data["pred_m2"]
+        profile.hist = {name: np.array(h, dtype=np.int64) for name, h in data["hist"].items()}
+        return profile
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Profile":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def build_reference(features: np.ndarray, model=None, chunk_size: int = 100_000) -> Profile:
+    """profile of the training data and of `model`'s predictions on it, in chunks (memmap friendly)."""
+    profile = Profile()
+    for start in range(0, len(features), chunk_size):
+        chunk = np.asarray(features[start:start + chunk_size])
+        profile.update(chunk, None if model is None else model.predict(chunk))
+    return profile
+
+
+def psi(reference: np.ndarray, current: np.ndarray) -> float:
+    """population stability index between two histograms over the same bins."""
+    ref = np.maximum(reference / max(reference.sum(), 1), PSI_EPSILON)
+    cur = np.maximum(current / max(current.sum(), 1), PSI_EPSILON)
+    return float(np.sum((cur - ref) * np.log(cur / ref)))
+
+
+def ks(reference: np.ndarray, current: np.ndarray) -> float:
+    """largest gap between the two cumulative distributions, at bin resolution."""
+    ref = np.cumsum(reference) / max(reference.sum(), 1)
+    cur = np.cumsum(current) / max(current.sum(), 1)
+    return float(np.max(np.abs(cur - ref)))
+
+
+def drift_report(reference: Profile, current: Profile, psi_threshold: float = 0.25,
+                 ks_threshold: float = 0.15, min_rows: int = 1000) -> dict:
+    """
+    compare a live profile with the training reference.
+
+    return:
+    per-feature psi / ks / mean shift (in reference standard deviations),
+    the same for the predictions, and `retrain` with the reasons for it.
+    retraining is only suggested once `min_rows` rows were seen.
+    """
+    ref_std = reference.std()
+    features = {}
+    reasons = []
+    for j, name in enumerate(FEATURE_COLUMNS):
+        shift = abs(current.mean[j] - reference.mean[j]) / (ref_std[j] if ref_std[j] > 0 else 1.0)
+        scores = {
+            "psi": round(psi(reference.hist[name], current.hist[name]), 4),
+            "ks": round(ks(reference.hist[name], current.hist[name]), 4),
+            "mean_shift": round(float(shift), 4) if current.count else None,
+        }
+        features[name] = scores
+        if scores["psi"] > psi_threshold:
+            reasons.append(f"{name} psi {scores['psi']:.3f} > {psi_threshold}")
+        elif scores["ks"] > ks_threshold:
+            reasons.append(f"{name} ks {scores['ks']:.3f} > {ks_threshold}")
+
+    prediction = {
+        "psi": round(psi(reference.hist["prediction"], current.hist["prediction"]), 4),
+        "ks": round(ks(reference.hist["prediction"], current.hist["prediction"]), 4),
+        "mean": round(float(current.pred_mean), 4) if current.pred_count else None,
+        "reference_mean": round(float(reference.pred_mean), 4),
+    }
+    if current.pred_count and prediction["psi"] > psi_threshold:
+        reasons.append(f"prediction psi {prediction['psi']:.3f} > {psi_threshold}")
+
+    enough = current.count >= min_rows
+    return {
+        "rows": int(current.count),
+        "reference_rows": int(reference.count),
+        "max_psi": max(s["psi"] for s in features.values()),
+        "features": features,
+        "prediction": prediction,
+        "retrain": bool(enough and reasons),
+        "reasons": reasons if enough else [f"only {current.count} of {min_rows} rows seen"],
+    }
+
+
+class DriftMonitor:
+    """
+    thread-safe live profile against a fixed reference, for the serving tap.
+
+    `observe` takes request log records (the tuples queued by
+    api.request_log.RequestLog) so it can run on the log's writer thread.
+    """
+
+    def __init__(self, reference: Profile, psi_threshold: float = 0.25, ks_threshold: float = 0.15,
+                 min_rows: int = 1000):
+        self.reference = reference
+        self.current = Profile(reference.edges)
+        self.thresholds = {"psi_threshold": psi_threshold, "ks_threshold": ks_threshold, "min_rows": min_rows}
+        self._lock = threading.Lock()
+
+    def observe(self, records: list) -> None:
+        features = [r[3] for r in records if r[3] is not None]
+        preds = [r[4] for r in records if r[4] is not None and r[3] is not None]
+        if not features:
+            return
+        X = np.concatenate([np.asarray(f, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS)) for f in features])
+        p = np.concatenate([np.asarray(p, dtype=np.float64).ravel() for p in preds])
+        with self._lock:
+            self.current.update(X, p)
+
+    def report(self) -> dict:
+        with self._lock:
+            return drift_report(self.reference, self.current, **self.thresholds)
+
+
+def read_log(paths: list, batch_size: int = 10_000):
+    """yield (features, predictions) arrays of up to `batch_size` logged requests from jsonl(.gz) files."""
+    features, preds = [], []
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "features" not in record:
+                    continue  # bulk requests are logged without their rows
+                features.extend(record["features"])
+                preds.extend(record["prediction"])
+                if len(features) >= batch_size:
+                    yield np.array(features, dtype=np.float64), np.array(preds, dtype=np.float64)
+                    features, preds = [], []
+    if features:
+        yield np.array(features, dtype=np.float64), np.array(preds, dtype=np.float64)
+
+
+def main():
+    config = load_config()
+    settings = config.get("monitoring", {})
+
+    parser = argparse.ArgumentParser(description="Drift report of logged prediction requests.")
+    parser.add_argument("logs", nargs="+", help="request log files (.jsonl or .jsonl.gz)")
+    parser.add_argument("--reference", default=config["paths"].get("reference_profile",
+                                                                   "models/reference_profile.json"))
+    parser.add_argument("--state", default=None,
+                        help="live profile to resume from and save to, so logs can be fed incrementally")
+    parser.add_argument("--output", default=settings.get("report_path", "drift.json"))
+    args = parser.parse_args()
+
+    try:
+        reference = Profile.load(args.reference)
+        current = Profile.load(args.state) if args.state and os.path.exists(args.state) else Profile(reference.edges)
+        for features, preds in read_log(args.logs, settings.get("batch_size", 10_000)):
+            current.update(features, preds)
+        if args.state:
+            current.save(args.state)
+
+        report = drift_report(
+            reference, current,
+            psi_threshold=settings.get("psi_threshold", 0.25),
+            ks_threshold=settings.get("ks_threshold", 0.15),
+            min_rows=settings.get("min_rows", 1000),
+        )
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Drift report of {report['rows']} rows written to {args.output}: max psi "
+                    f"{report['max_psi']:.3f}, retrain {report['retrain']} {report['reasons']}")
+    except Exception as e:
+        logger.exception(f"Drift report failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
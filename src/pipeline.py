@@ -0,0 +1,211 @@
+"""
+run preprocessing, training and evaluation in one process.
+
+python -m src.pipeline
+
+the dvc stages each start an interpreter, reload features.npy/labels.npy
+and (for evaluation) unpickle the model training just wrote. here the
+arrays and the fitted model are handed from stage to stage in memory, and
+every file the stages declare in dvc.yaml (data/preprocess, models/,
+models_serving/, metrics.json) is still written, by a background thread while the next
+stage runs. data/preprocess and models/ hold the same bytes the stages
+would write. models_serving/model.joblib holds the same model, but its pickle
+bytes depend on what ran earlier in the process. metrics.json records
+measured latencies. so dvc.lock never matches after a run: always
+`dvc commit` afterwards.
+
+tuning and the lookup table are not part of this runner; run them with
+dvc repro.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import evaluate as evaluation
+from src import preprocessing as prep
+from src import train as training
+from src import validation
+from src.models import DEFAULT_BACKEND
+from src.utils import profiling
+from src.utils.config import load_config, model_parameters
+from src.utils.logger import get_logger
+from src.utils.schema import COLUMN_DTYPES, FEATURE_COLUMNS, TARGET_COLUMN
+from src.utils.storage import create_table
+
+logger = get_logger("pipeline.log")
+
+PREPROCESS_DIR = "data/preprocess"
+
+
+class BackgroundWriter:
+    """
+    runs file writes on one background thread, in submission order.
+
+    `wait` blocks until everything submitted so far has been written and
+    re-raises the first failure, so a run never reports success with missing
+    outputs.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-writer")
+        self._pending = []
+
+    def submit(self, name: str, fn, *args) -> None:
+        self._pending.append((name, self._pool.submit(fn, *args)))
+
+    def wait(self) -> None:
+        pending, self._pending = self._pending, []
+        for name, future in pending:
+            future.result()
+            logger.info(f"{name} written.")
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    # written under a temporary name so a crash never leaves a half file behind.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _save_table(path: str, columns: dict) -> None:
+    n_rows = len(next(iter(columns.values())))
+    tmp_path = path + ".tmp"
+    table = create_table(tmp_path, COLUMN_DTYPES, n_rows)
+    for name, column in columns.items():
+        table[name][:] = column
+        table[name].flush()
+    del table
+    os.replace(tmp_path, path)
+
+
+def preprocess(config: dict, writer: BackgroundWriter):
+    """
+    the preprocessing stage without the disk round trip.
+
+    produces the same arrays (and files) as src.preprocessing.main for the
+    configured mode: float32 features/labels plus students.tbl when
+    `preprocessing.streaming` is on, the in-memory `preprocessing` output
+    otherwise.
+    """
+    raw_path = config["paths"]["raw_data"]
+    os.makedirs(PREPROCESS_DIR, exist_ok=True)
+    quarantine = validation.open_quarantine(config)
+    chunk_size = config.get("preprocessing", {}).get("chunk_size", 100_000)
+
+    if config.get("preprocessing", {}).get("streaming", False):
+        with profiling.step("load"):
+            if quarantine is not None:
+                df = validation.read_all(raw_path, quarantine, COLUMN_DTYPES, chunk_size)
+            else:
+                df = pd.read_csv(raw_path, usecols=FEATURE_COLUMNS + [TARGET_COLUMN], dtype=COLUMN_DTYPES)
+        with profiling.step("transform") as step:
+            # row-major like the memmap preprocess_streaming fills.
+            X = np.ascontiguousarray(df[FEATURE_COLUMNS].to_numpy(dtype=np.float32))
+            y = df[TARGET_COLUMN].to_numpy(dtype=np.float32)
+            columns = {name: df[name].to_numpy() for name in COLUMN_DTYPES}
+            step.add(features=X, labels=y)
+        writer.submit(prep.TABLE_FILENAME, _save_table,
+                      os.path.join(PREPROCESS_DIR, prep.TABLE_FILENAME), columns)
+    else:
+        with profiling.step("load"):
+            if quarantine is not None:
+                df = validation.read_all(raw_path, quarantine, chunk_size=chunk_size)
+            else:
+                df = pd.read_csv(raw_path)
+        with profiling.step("transform") as step:
+            X, y = prep.preprocessing(df)
+            step.add(features=X, labels=y)
+
+    if quarantine is not None:
+        validation.finish(quarantine, validation.max_reject_fraction(config))
+    writer.submit("features.npy", _save_npy, config["paths"]["feature"], X)
+    writer.submit("labels.npy", _save_npy, config["paths"]["labels"], y)
+    logger.info(f"Preprocessed {len(y)} rows in memory.")
+    return X, y
+
+
+def fit(config: dict, X: np.ndarray, y: np.ndarray, writer: BackgroundWriter):
+    """the training stage on in-memory arrays; the model files are written in the background."""
+    params = model_parameters(config)
+    settings = config.get("training", {})
+    backend = config.get("model", {}).get("backend", DEFAULT_BACKEND)
+
+    if settings.get("incremental", False):
+        # decides from the previous model on disk, so the files must be in place first.
+        writer.wait()
+        return training.incremental_train(X, y, params, settings, backend)
+
+    model = training.train(X, y, params, backend, save=False)
+    writer.submit("model", training.save_model, model)
+    writer.submit("train manifest", training.write_manifest, X, y, params, model, backend)
+    return model
+
+
+def run(config: dict) -> dict:
+    """
+    run the three stages and wait for every output file.
+
+    return:
+    the evaluation summary (as written to metrics.json).
+    """
+    start = time.perf_counter()
+    writer = BackgroundWriter()
+    try:
+        profiling.start("preprocessing", config)
+        X, y = preprocess(config, writer)
+        profiling.save()
+
+        profiling.start("training", config)
+        model = fit(config, X, y, writer)
+        profiling.save()
+
+        profiling.start("evaluation", config)
+        settings = config.get("evaluation", {})
+        storage = config.get("storage", {})
+        truncation = settings.get("truncation", {})
+        candidates = evaluation.build_candidates(model, settings.get("candidates"))
+        with profiling.step("cross_validation"):
+            summary = evaluation.evaluate(
+                X, y, candidates,
+                n_splits=settings.get("n_splits", 5),
+                n_jobs=settings.get("n_jobs", 1),
+                chunk_size=storage.get("chunk_size", 100_000),
+                staged="model" if truncation.get("enabled", False) else None,
+            )
+        with profiling.step("truncation"):
+            served, serving = evaluation.serving_model(model, summary["model"], X,
+                                                       truncation.get("tolerance", 0.01))
+        writer.submit("serving model", evaluation.save_serving_model, served,
+                      config["paths"].get("serving_model_path", "models_serving/model.joblib"),
+                      config["paths"].get("serving_registry_dir"), truncation.get("activate", True),
+                      config.get("registry", {}).get("keep", 0))
+        writer.submit("metrics", evaluation.save_metrics, summary,
+                      config["paths"].get("metrics_path", "metrics.json"), serving)
+        profiling.save()
+    finally:
+        writer.close()
+
+    logger.info(f"Pipeline finished in {time.perf_counter() - start:.2f} seconds.")
+    return summary
+
+
+def main():
+    try:
+        run(load_config())
+    except Exception as e:
+        logger.exception(f"Pipeline failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+score a whole student csv out of core.
+
+python -m src.predict_batch <input.csv> --output predictions.tbl
+
+the csv is streamed in chunks with the same column handling as
+src.preprocessing (compact dtypes, StudentID kept as the key, GPA and
+GradeClass ignored when present), and validated like it (src.validation):
+rows that fail are written with their StudentID and reason to a quarantine
+csv next to the output instead of aborting the run. chunks are scored by a pool of worker
+processes, each holding the model once, and the predictions are written
+into a memory-mapped column table (src.utils.storage) with StudentID and
+prediction columns, or to parquet when the output ends in .parquet.
+"""
+import os
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src import registry, validation
+from src.preprocessing import count_rows
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import COLUMN_DTYPES, FEATURE_COLUMNS, ID_COLUMN
+from src.utils.storage import create_table, open_table, set_table_rows
+
+logger = get_logger("predict_batch.log")
+
+# model of a pool worker, loaded once by _init_worker.
+_worker_model = {}
+
+
+def load_scoring_model(config: dict):
+    """
+    the active registry version when there is one (tree arrays memory-mapped,
+    so every worker shares the same pages), otherwise paths.model_path.
+    """
+    registry_dir = registry.serving_registry_dir(config["paths"])
+    version = registry.current_version(registry_dir) if registry_dir else None
+    if version is not None:
+        return registry.load_version(registry_dir, version)
+    import joblib
+
+    return joblib.load(config["paths"].get("model_path", "models/model.joblib"))
+
+
+def _init_worker(config: dict) -> None:
+    _worker_model["model"] = load_scoring_model(config)
+
+
+def _score_chunk(features: np.ndarray) -> np.ndarray:
+    return _worker_model["model"].predict(features)
+
+
+def quarantine_path(output_path: str) -> str:
+    """csv of the rejected input rows, e.g. predictions.quarantine.csv next to predictions.tbl."""
+    return os.path.splitext(output_path)[0] + ".quarantine.csv"
+
+
+def read_chunks(path: str, chunk_size: int, quarantine: validation.Quarantine = None):
+    """yield (student ids, float32 feature matrix) per csv chunk, invalid rows left out."""
+    columns = [ID_COLUMN] + FEATURE_COLUMNS
+    dtypes = {col: COLUMN_DTYPES[col] for col in FEATURE_COLUMNS}
+    dtypes[ID_COLUMN] = "int64"
+    for chunk in validation.read_clean(path, quarantine, dtypes, chunk_size, columns=columns):
+        if len(chunk):
+            yield chunk[ID_COLUMN].to_numpy(), chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+
+
+def predict_file(input_path: str, output_path: str, config: dict, chunk_size: int = 100_000,
+                 n_jobs: int = -1) -> int:
+    """
+    score `input_path` into `output_path`.
+
+    at most 2 * n_jobs chunks are in flight, so memory stays bounded by the
+    chunk size whatever the input size.
+
+    return:
+    number of rows scored.
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    n_rows = count_rows(input_path)
+    logger.info(f"Scoring {n_rows} rows from {input_path} in chunks of {chunk_size} on {n_jobs} worker(s)...")
+
+    quarantine = validation.Quarantine(quarantine_path(output_path))
+    parquet = output_path.endswith(".parquet")
+    tmp_path = output_path + ".tmp"
+    table = create_table(tmp_path, {ID_COLUMN: "int64", "prediction": "float64"}, n_rows)
+    written = 0
+
+    def drain(pending: list, keep: int) -> None:
+        nonlocal written
+        while len(pending) > keep:
+            ids, future = pending.pop(0)
+            n = len(ids)
+            table[ID_COLUMN][written:written + n] = ids
+            table["prediction"][written:written + n] = future.result()
+            written += n
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(config,)) as pool:
+        pending = []
+        for ids, features in read_chunks(input_path, chunk_size, quarantine):
+            pending.append((ids, pool.submit(_score_chunk, features)))
+            drain(pending, 2 * n_jobs)
+        drain(pending, 0)
+
+    for column in table.values():
+        column.flush()
+    del table
+    if written < n_rows:
+        set_table_rows(tmp_path, written)
+
+    if parquet:
+        _write_parquet(tmp_path, output_path)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, output_path)
+
+    validation.finish(quarantine)
+    seconds = time.time() - start
+    logger.info(f"{written} predictions written to {output_path} in {seconds:.2f} seconds "
+                f"({written / max(seconds, 1e-9):.0f} rows/s)")
+    return written
+
+
+def _write_parquet(table_path: str, output_path: str, row_group: int = 1_000_000) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("writing .parquet output needs pyarrow (pip install pyarrow)")
+
+    header, columns = open_table(table_path)
+    schema = pa.schema([(col["name"], pa.from_numpy_dtype(np.dtype(col["dtype"]))) for col in header["columns"]])
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for start in range(0, header["n_rows"], row_group):
+            batch = {name: columns[name][start:start + row_group] for name in schema.names}
+            writer.write_table(pa.table(batch, schema=schema))
+
+
+def main():
+    config = load_config()
+    settings = config.get("batch_scoring", {})
+
+    parser = argparse.ArgumentParser(description="Score a student csv out of core.")
+    parser.add_argument("input", help="csv with StudentID and the 12 feature columns")
+    parser.add_argument("--output", default="predictions.tbl",
+                        help="column table (.tbl) or parquet (.parquet) output")
+    parser.add_argument("--chunk-size", type=int, default=settings.get("chunk_size", 100_000))
+    parser.add_argument("--n-jobs", type=int, default=settings.get("n_jobs", -1))
+    args = parser.parse_args()
+
+    try:
+        predict_file(args.input, args.output, config, args.chunk_size, args.n_jobs)
+    except Exception as e:
+        logger.exception(f"Batch scoring failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,16 @@ import numpy as np
 from typing import Tuple
 
 import os
+from src import validation
+from src.utils import profiling
+from src.utils.config import load_config
 from src.utils.logger import get_logger
+from src.utils.schema import COLUMN_DTYPES, FEATURE_COLUMNS, TARGET_COLUMN
+from src.utils.storage import create_table, set_table_rows
 
+TABLE_FILENAME = "students.tbl"
 
-"""
-define logger for the logs.
-"""
-try:
-    logger = get_logger("preprocessing.log")
-    print(f"loger object created successfully.")
-except ModuleNotFoundError:
-    Exception(f"Module Not Found Error")
-    raise
-except Exception as e:
-    Exception(f"Some unexpected error occured")
-    raise
+logger = get_logger("preprocessing.log")
 
 
 def preprocessing(data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
@@ -51,6 +46,125 @@ def preprocessing(data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
 
     
 
+def count_rows(path: str, block_size: int = 1 << 24) -> int:
+    """
+    count data rows of a csv without parsing it (header excluded).
+    reads fixed size blocks, so memory does not depend on the file size.
+    """
+    n_lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        n_lines += 1
+    return max(n_lines - 1, 0)
+
+
+def preprocess_streaming(raw_path: str, out_dir: str, chunk_size: int = 100_000,
+                         quarantine: validation.Quarantine = None) -> int:
+    """
+    stream the raw csv into features.npy / labels.npy chunk by chunk.
+
+    StudentID and GradeClass are never parsed, every other column is read
+    with the compact dtype from src.utils.schema, and each chunk is copied
+    straight into memory-mapped output files, so peak memory is bounded by
+    `chunk_size` instead of the input size. the same chunks also fill
+    students.tbl, the column-typed copy described in src.utils.storage.
+
+    with a `quarantine`, each chunk goes through src.validation first and
+    only the clean rows are stored.
+
+    args:
+    raw_path: path of the raw csv.
+    out_dir: directory for features.npy and labels.npy.
+    chunk_size: rows parsed per chunk.
+    quarantine: receives the rows that fail the schema checks.
+
+    return:
+    number of rows written.
+    """
+    try:
+        with profiling.step("count_rows"):
+            n_rows = count_rows(raw_path)
+        logger.info(f"streaming {n_rows} rows from {raw_path} in chunks of {chunk_size}")
+
+        os.makedirs(out_dir, exist_ok=True)
+        feature_path = os.path.join(out_dir, "features.npy")
+        label_path = os.path.join(out_dir, "labels.npy")
+        X = np.lib.format.open_memmap(feature_path, mode="w+", dtype=np.float32,
+                                      shape=(n_rows, len(FEATURE_COLUMNS)))
+        y = np.lib.format.open_memmap(label_path, mode="w+", dtype=np.float32, shape=(n_rows,))
+        table_path = os.path.join(out_dir, TABLE_FILENAME)
+        table = create_table(table_path, COLUMN_DTYPES, n_rows)
+
+        written = 0
+        if quarantine is not None:
+            reader = validation.read_clean(raw_path, quarantine, COLUMN_DTYPES, chunk_size)
+        else:
+            reader = pd.read_csv(
+                raw_path,
+                usecols=FEATURE_COLUMNS + [TARGET_COLUMN],
+                dtype=COLUMN_DTYPES,
+                chunksize=chunk_size,
+            )
+        chunks = iter(reader)
+        while True:
+            with profiling.step("load"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            n = len(chunk)
+            if written + n > n_rows:
+                raise ValueError(f"{raw_path} has more rows than counted ({n_rows})")
+            with profiling.step("transform"):
+                chunk_X = chunk[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+                chunk_y = chunk[TARGET_COLUMN].to_numpy(dtype=np.float32)
+            with profiling.step("save"):
+                X[written:written + n] = chunk_X
+                y[written:written + n] = chunk_y
+                for name, column in table.items():
+                    column[written:written + n] = chunk[name].to_numpy()
+            written += n
+        with profiling.step("save") as step:
+            step.add(features=X[:written], labels=y[:written])
+            X.flush()
+            y.flush()
+            for column in table.values():
+                column.flush()
+        del X, y, table
+
+        if written < n_rows:
+            # blank and malformed lines were counted but skipped by the
+            # parser, quarantined rows were dropped.
+            _shrink(feature_path, written)
+            _shrink(label_path, written)
+            set_table_rows(table_path, written)
+
+        logger.info(f"{written} rows stored as float32 in {out_dir}")
+        return written
+    except Exception as e:
+        logger.error(f"Some unexpected error occured: {e}")
+        raise
+
+
+def _shrink(path: str, n_rows: int, chunk_size: int = 1_000_000) -> None:
+    """rewrite a .npy file keeping only its first `n_rows` rows."""
+    src = np.load(path, mmap_mode="r")
+    tmp_path = path + ".tmp"
+    dst = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=src.dtype,
+                                    shape=(n_rows,) + src.shape[1:])
+    for start in range(0, n_rows, chunk_size):
+        dst[start:start + chunk_size] = src[start:min(start + chunk_size, n_rows)]
+    dst.flush()
+    del src, dst
+    os.replace(tmp_path, path)
+
+
 def main():
     """
     this method first load the raw data.
@@ -58,46 +172,48 @@ def main():
     """
 
     try:
+        config = load_config()
+        data_path = config["paths"]["raw_data"]
+        settings = config.get("preprocessing", {})
+        profiling.start("preprocessing", config)
 
-        data_path = r"E:\project\Student-Performance-System-Using-Mlops\data\raw\student.csv"
-        df = pd.read_csv(data_path)
+        data_dir_path = r"data/preprocess"
+        quarantine = validation.open_quarantine(config)
+
+        if settings.get("streaming", False):
+            preprocess_streaming(data_path, data_dir_path, settings.get("chunk_size", 100_000), quarantine)
+            if quarantine is not None:
+                validation.finish(quarantine, validation.max_reject_fraction(config))
+            profiling.save()
+            return
+
+        with profiling.step("load"):
+            if quarantine is not None:
+                df = validation.read_all(data_path, quarantine, chunk_size=settings.get("chunk_size", 100_000))
+            else:
+                df = pd.read_csv(data_path)
         logger.info(f"data loaded successfully from: {data_path}")
+        if quarantine is not None:
+            validation.finish(quarantine, validation.max_reject_fraction(config))
 
-        X, y = preprocessing(df)
+        with profiling.step("transform") as step:
+            X, y = preprocessing(df)
+            step.add(features=X, labels=y)
         logger.info(f"data pre-procssed successfully.")
 
-        data_dir_path = r"data/preprocess"
         os.makedirs(data_dir_path, exist_ok=True)
         logger.info(f"data path for X, y created.")
 
-        np.save(os.path.join(data_dir_path, 'features.npy'), X)
-        np.save(os.path.join(data_dir_path, "labels.npy"), y)
+        with profiling.step("save"):
+            np.save(os.path.join(data_dir_path, 'features.npy'), X)
+            np.save(os.path.join(data_dir_path, "labels.npy"), y)
         logger.info(f"X and y stored successfully.")
+        profiling.save()
 
     except Exception as e:
-        logger.info(f"Some unexpected error occured.")
+        logger.exception(f"Some unexpected error occured: {e}")
+        raise
     
 
 if __name__ == "__main__":
     main()
-
-
-
-
-
-
-      
-      
-      
-    
- 
-  
-  
-  
-      
-    
-  
-  
-
-  
-
@@ -0,0 +1,199 @@
+"""
+versioned, content-addressed model registry under `paths.model_dir`.
+
+every registered model lives in registry/<version>/ where version is the
+first 16 hex digits of the sha256 of its joblib file, next to a flat array
+copy (src.compiled_model) that loads memory-mapped in milliseconds. the
+CURRENT file names the active version and is replaced atomically, so a
+reader sees either the old or the new version, never a partial one.
+version directories and CURRENT get ordinary 0755/0644 permissions (not the
+private modes of mkdtemp/mkstemp), so a service running as another user can
+read them. `register(keep=n)` deletes the oldest versions beyond the newest
+n, never the active one.
+
+layout:
+registry/
+    CURRENT
+    <version>/model.joblib
+    <version>/arrays/*.npy        (GradientBoostingRegressor only)
+    <version>/explainer/*.npy     (root-to-leaf paths for src.explain, same models)
+    <version>/meta.json
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+from src.compiled_model import CompiledEnsemble, compilable
+from src.explain import TreeExplainer
+from src.utils.logger import get_logger
+
+logger = get_logger("train.log")
+
+CURRENT_FILENAME = "CURRENT"
+MODEL_FILENAME = "model.joblib"
+ARRAYS_DIRNAME = "arrays"
+EXPLAINER_DIRNAME = "explainer"
+META_FILENAME = "meta.json"
+DIR_MODE = 0o755
+FILE_MODE = 0o644
+
+
+def _sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: str, text: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.chmod(tmp_path, FILE_MODE)
+    os.replace(tmp_path, path)
+
+
+def version_dir(registry_dir: str, version: str) -> str:
+    return os.path.join(registry_dir, version)
+
+
+def register(model_path: str, registry_dir: str, activate: bool = True, keep: int = 0) -> str:
+    """
+    add the joblib model at `model_path` to the registry.
+
+    registering the same bytes twice is a no-op and returns the same version.
+    with `keep` > 0 only the newest `keep` versions (plus the active one)
+    stay on disk afterwards.
+
+    return:
+    the version id.
+    """
+    import joblib
+
+    version = _sha256(model_path)[:16]
+    target = version_dir(registry_dir, version)
+
+    if not os.path.exists(os.path.join(target, META_FILENAME)):
+        os.makedirs(registry_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=registry_dir, prefix=".staging-")
+        try:
+            os.chmod(staging, DIR_MODE)
+            shutil.copyfile(model_path, os.path.join(staging, MODEL_FILENAME))
+            model = joblib.load(model_path)
+            has_arrays = compilable(model)
+            if has_arrays:
+                CompiledEnsemble.from_model(model).save_dir(os.path.join(staging, ARRAYS_DIRNAME))
+                TreeExplainer.from_model(model).save_dir(os.path.join(staging, EXPLAINER_DIRNAME))
+            meta = {
+                "version": version,
+                "model_class": model.__class__.__name__,
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "arrays": has_arrays,
+            }
+            with open(os.path.join(staging, META_FILENAME), "w") as f:
+                json.dump(meta, f, indent=2)
+            # the version directory appears complete or not at all.
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info(f"Model registered as version {version}.")
+
+    if activate:
+        activate_version(registry_dir, version)
+    if keep:
+        prune(registry_dir, keep)
+    return version
+
+
+def prune(registry_dir: str, keep: int) -> list:
+    """
+    delete all but the newest `keep` versions; the active version is always kept.
+
+    a service still serving a deleted version keeps its memory-mapped arrays
+    (the pages stay valid until unmapped) and loads the active one on its
+    next model check.
+
+    return:
+    the deleted version ids.
+    """
+    active = current_version(registry_dir)
+    versions = [meta["version"] for meta in list_versions(registry_dir)]
+    removed = [version for version in versions[:max(len(versions) - keep, 0)] if version != active]
+    for version in removed:
+        shutil.rmtree(version_dir(registry_dir, version), ignore_errors=True)
+        logger.info(f"Model version {version} removed from the registry (keeping {keep}).")
+    return removed
+
+
+def activate_version(registry_dir: str, version: str) -> None:
+    """point CURRENT at `version` (atomic rename)."""
+    if not os.path.exists(os.path.join(version_dir(registry_dir, version), META_FILENAME)):
+        raise FileNotFoundError(f"Model version not found in registry: {version}")
+    _atomic_write(os.path.join(registry_dir, CURRENT_FILENAME), version + "\n")
+    logger.info(f"Model version {version} activated.")
+
+
+def current_version(registry_dir: str):
+    """active version id, None when nothing was registered yet."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILENAME), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def serving_registry_dir(paths: dict):
+    """
+    registry the service, batch scoring and the lookup table load from: the
+    serving registry written by src.evaluate once it holds a version,
+    otherwise the training registry.
+    """
+    serving_dir = paths.get("serving_registry_dir")
+    if serving_dir and current_version(serving_dir) is not None:
+        return serving_dir
+    return paths.get("registry_dir")
+
+
+def list_versions(registry_dir: str) -> list:
+    """metadata of every registered version, oldest first."""
+    versions = []
+    if not os.path.isdir(registry_dir):
+        return versions
+    for name in os.listdir(registry_dir):
+        meta_path = os.path.join(registry_dir, name, META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                versions.append(json.load(f))
+    return sorted(versions, key=lambda meta: meta["created_at"])
+
+
+def load_version(registry_dir: str, version: str, prefer_arrays: bool = True, mmap: bool = True):
+    """
+    load a registered model.
+
+    with `prefer_arrays` the flat array copy is memory-mapped (a
+    CompiledEnsemble) when the version has one, otherwise the pickle is
+    unpickled.
+    """
+    target = version_dir(registry_dir, version)
+    arrays_dir = os.path.join(target, ARRAYS_DIRNAME)
+    if prefer_arrays and os.path.isdir(arrays_dir):
+        return CompiledEnsemble.load_dir(arrays_dir, mmap=mmap)
+    import joblib
+
+    return joblib.load(os.path.join(target, MODEL_FILENAME))
+
+
+def load_explainer(registry_dir: str, version: str, mmap: bool = True) -> TreeExplainer:
+    """
+    attribution arrays of a registered model, memory-mapped; versions
+    registered before they existed are exported from the pickle.
+    """
+    explainer_dir = os.path.join(version_dir(registry_dir, version), EXPLAINER_DIRNAME)
+    if os.path.isdir(explainer_dir):
+        return TreeExplainer.load_dir(explainer_dir, mmap=mmap)
+    return TreeExplainer.from_model(load_version(registry_dir, version, prefer_arrays=False))
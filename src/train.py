@@ -1,45 +1,207 @@
 import os
+import json
 import time
-import yaml
-import joblib
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
+from src.compiled_model import CompiledEnsemble, compilable
+from src.models import DEFAULT_BACKEND, build_model, n_trees, set_n_trees
+from src.monitoring import build_reference
+from src.registry import register
+from src.utils import profiling
+from src.utils.config import load_config, model_parameters
 from src.utils.logger import get_logger
+from src.utils.storage import data_hash, load_arrays
 
-CONFIG_PATH = "config.yaml"
-MODEL_DIR = "models"
 MODEL_FILENAME = "model.joblib"
+COMPILED_FILENAME = "model_compiled.npz"
+MANIFEST_FILENAME = "train_manifest.json"
+REFERENCE_FILENAME = "reference_profile.json"
 
 logger = get_logger("train.log")
 
-def load_config(path: str = CONFIG_PATH) -> dict:
-    try:
-        with open(path, "r") as f:
-            config = yaml.safe_load(f)
-        logger.info("Configuration loaded successfully.")
-        return config
-    except Exception as e:
-        logger.error(f"Error loading config: {e}")
-        raise
-
-def train(features: np.ndarray, labels: np.ndarray, params: dict) -> GradientBoostingRegressor:
-    model = GradientBoostingRegressor(**params)
-    start = time.time()
-    model.fit(features, labels)
-    logger.info(f"Model trained in {time.time() - start:.2f} seconds")
-     
-    # save model.
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    joblib.dump(model, os.path.join(MODEL_DIR, MODEL_FILENAME))
+
+def model_paths() -> dict:
+    """
+    where training writes, from config.yaml `paths` (the same registry_dir
+    the api serves from); the file names above are only the fallbacks.
+    """
+    paths = load_config()["paths"]
+    model_dir = paths.get("model_dir", "models/")
+    return {
+        "model": paths.get("model_path", os.path.join(model_dir, MODEL_FILENAME)),
+        "compiled": paths.get("compiled_model_path", os.path.join(model_dir, COMPILED_FILENAME)),
+        "manifest": os.path.join(model_dir, MANIFEST_FILENAME),
+        "reference": paths.get("reference_profile", os.path.join(model_dir, REFERENCE_FILENAME)),
+        "registry": paths.get("registry_dir", os.path.join(model_dir, "registry")),
+    }
+
+
+def save_model(model) -> None:
+    import joblib
+
+    paths = model_paths()
+    os.makedirs(os.path.dirname(paths["model"]) or ".", exist_ok=True)
+    joblib.dump(model, paths["model"])
     logger.info("Model saved successfully.")
+
+    # flat array export used by the compiled serving backend.
+    compiled_path = paths["compiled"]
+    if compilable(model):
+        CompiledEnsemble.from_model(model).save(compiled_path)
+        logger.info("Compiled model exported successfully.")
+    elif os.path.exists(compiled_path):
+        # a stale export of an older model must not be served.
+        os.remove(compiled_path)
+
+    # versioned copy for serving; activating it hot-swaps running services.
+    register(paths["model"], paths["registry"], keep=load_config().get("registry", {}).get("keep", 0))
+
+
+def train(features: np.ndarray, labels: np.ndarray, params: dict, backend: str = DEFAULT_BACKEND,
+          save: bool = True):
+    """fit a model of `backend`; with `save` it is written (and registered) right away."""
+    model = build_model(params, backend)
+    start = time.time()
+    with profiling.step("fit", features=features, labels=labels):
+        model.fit(features, labels)
+    logger.info(f"Model ({backend}) trained in {time.time() - start:.2f} seconds")
+
+    if save:
+        with profiling.step("save"):
+            save_model(model)
+    return model
+
+
+def data_stats(features: np.ndarray, labels: np.ndarray) -> dict:
+    """per-column mean/std of features and labels, used as the drift reference."""
+    return {
+        "feature_mean": np.mean(features, axis=0, dtype=np.float64).tolist(),
+        "feature_std": np.std(features, axis=0, dtype=np.float64).tolist(),
+        "label_mean": float(np.mean(labels, dtype=np.float64)),
+        "label_std": float(np.std(labels, dtype=np.float64)),
+    }
+
+
+def drift_score(reference: dict, features: np.ndarray, labels: np.ndarray) -> float:
+    """largest shift of a feature or label mean, in reference standard deviations."""
+    new = data_stats(features, labels)
+    mean_old = np.array(reference["feature_mean"] + [reference["label_mean"]])
+    std_old = np.array(reference["feature_std"] + [reference["label_std"]])
+    mean_new = np.array(new["feature_mean"] + [new["label_mean"]])
+    return float(np.max(np.abs(mean_new - mean_old) / np.where(std_old > 0, std_old, 1.0)))
+
+
+def write_manifest(features: np.ndarray, labels: np.ndarray, params: dict, model,
+                   backend: str = DEFAULT_BACKEND) -> None:
+    manifest = {
+        "n_rows": len(labels),
+        "data_hash": data_hash(features, labels),
+        "params": params,
+        "backend": backend,
+        "n_estimators": n_trees(model),
+        "stats": data_stats(features, labels),
+    }
+    paths = model_paths()
+    with open(paths["manifest"], "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # what serving traffic is compared against by src.monitoring.
+    build_reference(features, model).save(paths["reference"])
+
+
+def incremental_train(features: np.ndarray, labels: np.ndarray, params: dict,
+                      settings: dict, backend: str = DEFAULT_BACKEND):
+    """
+    reuse the previous model when the training data only gained rows.
+
+    the manifest saved next to the model records the row count and a hash of
+    the rows it was trained on. if those rows are unchanged and only new rows
+    were appended, the new rows are compared to the stored feature/label
+    statistics: below `drift_threshold` the model is warm-started with
+    `warm_start_estimators` extra trees, otherwise (or when the data was
+    rewritten, the parameters changed, too many rows are new or the ensemble
+    hit `max_estimators`) it is retrained from scratch.
+    """
+    import joblib
+
+    start = time.time()
+    paths = model_paths()
+    manifest_path, model_path = paths["manifest"], paths["model"]
+
+    def full_retrain(reason: str):
+        logger.info(f"Incremental training: full retrain ({reason}).")
+        model = train(features, labels, params, backend)
+        with profiling.step("save"):
+            write_manifest(features, labels, params, model, backend)
+        return model
+
+    if not (os.path.exists(manifest_path) and os.path.exists(model_path)):
+        return full_retrain("no previous model")
+
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    if manifest["params"] != params or manifest.get("backend", DEFAULT_BACKEND) != backend:
+        return full_retrain("parameters changed")
+
+    n_old, n_total = manifest["n_rows"], len(labels)
+    if n_total < n_old or data_hash(features[:n_old], labels[:n_old]) != manifest["data_hash"]:
+        return full_retrain("previously seen rows changed")
+    logger.info(f"Incremental training: {n_total - n_old} new rows on top of {n_old} "
+                f"(checked in {time.time() - start:.2f} seconds).")
+
+    if n_total == n_old:
+        logger.info("Incremental training: no new rows, keeping the current model.")
+        return joblib.load(model_path)
+
+    new_fraction = (n_total - n_old) / n_total
+    if new_fraction > settings.get("max_new_fraction", 0.5):
+        return full_retrain(f"{new_fraction:.0%} of the rows are new")
+
+    drift = drift_score(manifest["stats"], features[n_old:], labels[n_old:])
+    if drift > settings.get("drift_threshold", 0.25):
+        return full_retrain(f"drift {drift:.3f} above threshold")
+
+    model = joblib.load(model_path)
+    n_estimators = n_trees(model) + settings.get("warm_start_estimators", 25)
+    if n_estimators > settings.get("max_estimators", 2 * params.get("n_estimators", 100)):
+        return full_retrain(f"ensemble would grow to {n_estimators} trees")
+
+    logger.info(f"Incremental training: drift {drift:.3f}, warm-starting "
+                f"{n_trees(model)} -> {n_estimators} estimators.")
+    fit_start = time.time()
+    set_n_trees(model, n_estimators, warm_start=True)
+    with profiling.step("fit", features=features, labels=labels):
+        model.fit(features, labels)
+    model.set_params(warm_start=False)
+    logger.info(f"Model warm-started in {time.time() - fit_start:.2f} seconds")
+
+    with profiling.step("save"):
+        save_model(model)
+        write_manifest(features, labels, params, model, backend)
+    logger.info(f"Incremental training finished in {time.time() - start:.2f} seconds")
     return model
 
+
 def main():
     config = load_config()
-    X = np.load(config["paths"]["feature"])
-    y = np.load(config["paths"]["labels"])
-    model_params = config["parameter"]
-    train(X, y, model_params)
+    profiling.start("training", config)
+    with profiling.step("load") as step:
+        X, y = load_arrays(
+            config["paths"]["feature"],
+            config["paths"]["labels"],
+            mmap=config.get("storage", {}).get("mmap", True),
+        )
+        step.add(features=X, labels=y)
+    model_params = model_parameters(config)
+    settings = config.get("training", {})
+    backend = config.get("model", {}).get("backend", DEFAULT_BACKEND)
+    if settings.get("incremental", False):
+        incremental_train(X, y, model_params, settings, backend)
+    else:
+        model = train(X, y, model_params, backend)
+        with profiling.step("save"):
+            write_manifest(X, y, model_params, model, backend)
+    profiling.save()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,213 @@
+import os
+import json
+import math
+import time
+import hashlib
+import yaml
+import numpy as np
+from src.evaluate import score_folds
+from src.models import DEFAULT_BACKEND, build_model
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.storage import data_hash, fold_indices, load_arrays
+
+logger = get_logger("tune.log")
+
+
+class FoldCache:
+    """
+    fold scores keyed by md5(data hash, parameters, fold).
+
+    kept as one json file so re-tuning after a config tweak, or on data that
+    did not change, only fits the (parameters, fold) pairs it has not seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(data_key: str, params: dict, fold: int, n_splits: int) -> str:
+        payload = json.dumps({"data": data_key, "params": params, "fold": fold, "n_splits": n_splits},
+                             sort_keys=True)
+        return hashlib.md5(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def put(self, key: str, scores: dict) -> None:
+        self.entries[key] = scores
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def sample_candidates(space: dict, n_candidates: int, seed: int = 42) -> list:
+    """
+    draw random parameter sets from the search space in config.yaml.
+
+    each entry of `space` is either a list of choices or a {low, high, log}
+    range; log ranges are sampled uniformly in log space.
+    """
+    rng = np.random.default_rng(seed)
+    candidates = []
+    for _ in range(n_candidates):
+        params = {}
+        for name, spec in space.items():
+            if isinstance(spec, list):
+                params[name] = spec[int(rng.integers(len(spec)))]
+            elif spec.get("log", False):
+                params[name] = float(math.exp(rng.uniform(math.log(spec["low"]), math.log(spec["high"]))))
+            else:
+                params[name] = float(rng.uniform(spec["low"], spec["high"]))
+        candidates.append(params)
+    return candidates
+
+
+def halving_schedule(n_candidates: int, max_estimators: int, min_estimators: int, factor: int) -> list:
+    """
+    (n_candidates, n_estimators) per rung of successive halving.
+
+    every rung keeps the best 1/factor of the candidates and gives them
+    factor times more boosting rounds; the last rung uses `max_estimators`.
+    """
+    if factor < 2:
+        raise ValueError(f"tuning.factor must be an integer >= 2, got {factor}")
+    # floor(log_factor(n_candidates)) + 1 in integers; math.log(243, 3) is 4.999...
+    n_rungs = 1
+    while factor ** n_rungs <= n_candidates:
+        n_rungs += 1
+    schedule = []
+    for rung in range(n_rungs):
+        n_estimators = int(max_estimators / factor ** (n_rungs - 1 - rung))
+        n_keep = max(1, int(n_candidates / factor ** rung))
+        schedule.append((n_keep, max(min_estimators, n_estimators)))
+    return schedule
+
+
+def tune(features: np.ndarray, labels: np.ndarray, base_params: dict, settings: dict,
+         backend: str = DEFAULT_BACKEND) -> dict:
+    """
+    successive-halving search over the gradient boosting space.
+
+    all candidates start with a few boosting rounds; after each rung only the
+    best 1/factor (by mean CV MAE) continue with more rounds. every
+    (candidate, fold) fit of a rung runs in parallel via src.evaluate.score_folds
+    and is looked up in / stored to the fold cache first.
+
+    args:
+    features, labels: training arrays, possibly memory-mapped.
+    base_params: the current `parameters` block; fixed values such as
+        random_state are kept, searched ones are overwritten.
+    settings: the `tuning` block of config.yaml.
+    backend: `model.backend`; the search runs on the same backend it tunes.
+
+    return:
+    dict with the best parameters and the per-rung history.
+    """
+    n_splits = settings.get("n_splits", 5)
+    n_jobs = settings.get("n_jobs", -1)
+    factor = settings.get("factor", 3)
+    max_estimators = settings.get("max_estimators", base_params.get("n_estimators", 250))
+    min_estimators = settings.get("min_estimators", 10)
+
+    space = settings["space"]
+    candidates = [{**base_params, **params}
+                  for params in sample_candidates(space, settings.get("n_candidates", 27),
+                                                  settings.get("seed", 42))]
+    schedule = halving_schedule(len(candidates), max_estimators, min_estimators, factor)
+
+    folds = list(fold_indices(len(labels), n_splits=n_splits, shuffle=True, random_state=42))
+    data_key = data_hash(features, labels)
+    cache = FoldCache(settings.get("cache_path"))
+    history = []
+
+    for rung, (n_keep, n_estimators) in enumerate(schedule):
+        candidates = candidates[:n_keep]
+        start = time.perf_counter()
+
+        trials = [{**params, "n_estimators": n_estimators} for params in candidates]
+        keys = [[FoldCache.key(data_key, {**params, "backend": backend}, i, n_splits) for i in range(len(folds))]
+                for params in trials]
+
+        # only fit the (candidate, fold) pairs the cache has not seen.
+        missing = [(c, i) for c in range(len(trials)) for i in range(len(folds)) if cache.get(keys[c][i]) is None]
+        tasks = [(build_model(trials[c], backend), *folds[i]) for c, i in missing]
+        for (c, i), scores in zip(missing, score_folds(features, labels, tasks, n_jobs=n_jobs)):
+            cache.put(keys[c][i], scores)
+        cache.save()
+
+        maes = [float(np.mean([cache.get(k)["mae"] for k in fold_keys])) for fold_keys in keys]
+        order = np.argsort(maes)
+        candidates = [candidates[j] for j in order]
+
+        history.append({
+            "rung": rung,
+            "n_candidates": len(trials),
+            "n_estimators": n_estimators,
+            "fits": len(tasks),
+            "cached": len(trials) * len(folds) - len(tasks),
+            "best_MAE": round(maes[order[0]], 4),
+            "seconds": round(time.perf_counter() - start, 2),
+        })
+        logger.info(f"rung {rung}: {len(trials)} candidates x {n_estimators} estimators, "
+                    f"{len(tasks)} fits ({history[-1]['cached']} cached), best MAE {maes[order[0]]:.4f}, "
+                    f"{history[-1]['seconds']:.2f} seconds")
+
+    best = {**candidates[0], "n_estimators": schedule[-1][1]}
+    return {"best_params": best, "best_MAE": history[-1]["best_MAE"], "rungs": history}
+
+
+def write_parameters(path: str, params: dict) -> None:
+    """
+    write the best parameters to their own yaml file (`paths.tuned_params`).
+
+    training lays them over the `parameters` block of config.yaml
+    (src.utils.config.model_parameters); config.yaml itself is never edited,
+    so the tuning stage does not change the params the training stage tracks.
+    """
+    text = "# written by src.tune, read by src.train over config.yaml `parameters`\n"
+    text += yaml.safe_dump({"parameters": params}, sort_keys=False)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def main():
+    try:
+        config = load_config()
+        settings = config.get("tuning", {})
+        X, y = load_arrays(config["paths"]["feature"], config["paths"]["labels"],
+                           mmap=config.get("storage", {}).get("mmap", True))
+
+        start = time.perf_counter()
+        result = tune(X, y, config["parameters"], settings,
+                      config.get("model", {}).get("backend", DEFAULT_BACKEND))
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        logger.info(f"Tuning finished in {result['seconds']:.2f} seconds, best MAE {result['best_MAE']:.4f}: "
+                    f"{result['best_params']}")
+
+        tuned_path = config["paths"].get("tuned_params", "tuned_params.yaml")
+        write_parameters(tuned_path, result["best_params"])
+        logger.info(f"Best parameters written to {tuned_path}.")
+
+        with open(settings.get("results_path", "tuning.json"), "w") as f:
+            json.dump(result, f, indent=2)
+    except Exception as e:
+        logger.exception(f"Tuning pipeline failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
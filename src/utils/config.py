@@ -0,0 +1,51 @@
+"""
+config.yaml, parsed once per process.
+
+every stage, the api and the logger read the same file; `load_config`
+parses it on first use and hands out copies of the cached result. the file
+is parsed again only when its mtime or size changed.
+"""
+import copy
+import os
+
+CONFIG_PATH = "config.yaml"
+
+# absolute path -> ((mtime_ns, size), parsed config)
+_cache = {}
+
+
+def load_config(path: str = CONFIG_PATH) -> dict:
+    """
+    args:
+    path: path of the yaml config, relative to the working directory.
+
+    return:
+    the parsed config; a private copy the caller may modify.
+    """
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _cache.get(key)
+    if cached is None or cached[0] != stamp:
+        import yaml
+
+        with open(key, "r") as f:
+            cached = (stamp, yaml.safe_load(f))
+        _cache[key] = cached
+    return copy.deepcopy(cached[1])
+
+
+def model_parameters(config: dict) -> dict:
+    """
+    the `parameters` block with the winners of src.tune (the yaml file at
+    `paths.tuned_params`, a dvc output of the tuning stage) laid over it,
+    when that file exists.
+    """
+    params = dict(config["parameters"])
+    path = config["paths"].get("tuned_params")
+    if path and os.path.exists(path):
+        import yaml
+
+        with open(path, "r") as f:
+            params.update((yaml.safe_load(f) or {}).get("parameters") or {})
+    return params
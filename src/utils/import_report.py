@@ -0,0 +1,91 @@
+"""
+import cost of the entry points, from `python -X importtime`.
+
+python -m src.utils.import_report                      # all entry points
+python -m src.utils.import_report api.main --top 20 --output import_times.json
+
+every module is imported in a fresh interpreter with -X importtime. the
+report gives the total import time and the top-level packages that account
+for it (self time summed per package), so a heavy dependency creeping into
+the serving or cli start-up path shows up by name.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+ENTRY_POINTS = (
+    "api.main",
+    "src.predict_batch",
+    "src.preprocessing",
+    "src.train",
+    "src.evaluate",
+    "src.tune",
+    "src.lookup_table",
+)
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    return:
+    (module, self_us, cumulative_us) per `import time:` line, in output order.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        rows.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return rows
+
+
+def import_times(module: str) -> dict:
+    """import `module` in a fresh interpreter and summarise where the time went."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = parse_importtime(result.stderr)
+    total_us = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    packages = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "n_modules": len(rows),
+        "packages_ms": {
+            name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda kv: -kv[1])
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report of the entry points.")
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    parser.add_argument("--top", type=int, default=8, help="packages listed per module")
+    parser.add_argument("--output", default=None, help="optional json file for the report")
+    args = parser.parse_args()
+
+    report = []
+    for module in args.modules:
+        times = import_times(module)
+        report.append(times)
+        top = list(times["packages_ms"].items())[:args.top]
+        print(f"{module:<20} {times['total_ms']:>9.1f} ms  {times['n_modules']:>4} modules")
+        for name, ms in top:
+            print(f"    {name:<24} {ms:>9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
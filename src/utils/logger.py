@@ -1,69 +1,135 @@
+import atexit
+import json
 import logging
 import os
-import yaml
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from src.utils.config import load_config
+
+# nothing in the repo logs thread, process or multiprocessing names, so
+# skip collecting them for every record.
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H-%M-%S"
+CONSOLE_FORMAT = "%(levelname)s - %(message)s"
+
+# one logger (and one queue listener) per log file, created on first use.
+_loggers = {}
+_listeners = {}
+_settings = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """one json object per line: ts, level, logger, message (and exc when there is a traceback)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    QueueHandler for a queue read by a thread of the same process.
+
+    the stock handler formats every record before queueing it (so it can be
+    pickled); here the record is queued as is and all formatting happens
+    on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def logging_settings() -> dict:
+    """
+    `paths.logs_dir` and the `logging` block of config.yaml, read once per process.
+
+    return:
+    dict with logs_dir, level, format ("text" or "json") and console.
+    """
+    if not _settings:
+        config = load_config()
+        settings = config.get("logging") or {}
+        _settings.update(
+            logs_dir=config["paths"]["logs_dir"],
+            level=str(settings.get("level", "INFO")).upper(),
+            format=settings.get("format", "text"),
+            console=settings.get("console", True),
+        )
+    return _settings
 
 
 def get_logger(file_name: str) -> logging.Logger:
-        """
-        logs the the data in logs dir.
-        args:
-        file_name: str = file name of the log file(ex. pipeline.log, model.log).
-
-        return:
-        logger: logging.logger = logger object.
-
-        """
-
-        header = f"\n{'-'*60}\n--- Logger session started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---\n{'-'*60}"
-        print(header)
-        
-        try:
-            # load the logs dir path
-            with open("config.yaml", "r") as f:
-                config = yaml.safe_load(f)
-            
-            logs_path = config["paths"]["logs_dir"] 
-            
-            # create logs dir
-            os.makedirs(logs_path, exist_ok=True)
-        except FileNotFoundError:
-            raise
-        except Exception as e:
-            Exception (f"Some unexpected error occured: {e}")
-            raise
-
-        # define log file path
-        file_path = os.path.join(logs_path, file_name)
-        # create logger object
-        logger = logging.getLogger(__name__)
-        logger.setLevel(logging.INFO)
-        
-        # prevent duplicate logs if imported multiple times
-        if not logger.handlers:
-             # file handler
-             file_handler = logging.FileHandler(file_path)
-             file_handler.setFormatter(
-                  logging.Formatter(
-                       "%(asctime)s - %(levelname)s - %(message)s",
-                       "%Y-%m-%d %H-%M-%S"
-                  )
-             )
-
-             # concole handler
-             console_handler = logging.StreamHandler()
-             console_handler.setFormatter(
-                  logging.Formatter(
-                       "%(levelname)s - %(message)s",
-                    )
-                )
-             
-             # Add handlers to logger object
-             logger.addHandler(file_handler)
-             logger.addHandler(console_handler)
-        
-        return logger
+    """
+    logs the data in logs dir.
+
+    every log file gets its own logger, so stages sharing a process still
+    write to their own file. records go through a queue and are formatted
+    and written by a background listener thread.
+
+    args:
+    file_name: str = file name of the log file(ex. pipeline.log, model.log).
+
+    return:
+    logger: logging.logger = logger object.
+    """
+    if file_name in _loggers:
+        return _loggers[file_name]
+
+    settings = logging_settings()
+    os.makedirs(settings["logs_dir"], exist_ok=True)
+
+    file_handler = logging.FileHandler(os.path.join(settings["logs_dir"], file_name))
+    if settings["format"] == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+    handlers = [file_handler]
+    if settings["console"]:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers)
+    listener.start()
+
+    logger = logging.getLogger(f"student_performance.{os.path.splitext(file_name)[0]}")
+    logger.setLevel(settings["level"])
+    logger.propagate = False
+    logger.handlers = [_LocalQueueHandler(records)]
+
+    _listeners[file_name] = listener
+    _loggers[file_name] = logger
+    return logger
+
+
+def _stop_listeners() -> None:
+    # drain the queues before the interpreter (and logging.shutdown) closes the files.
+    for listener in _listeners.values():
+        listener.stop()
+    _listeners.clear()
 
 
+def _after_fork() -> None:
+    # a forked worker (e.g. a ProcessPoolExecutor worker) has the queues but
+    # not the listener threads; log straight to the handlers there.
+    for file_name, logger in _loggers.items():
+        if file_name in _listeners:
+            logger.handlers = list(_listeners[file_name].handlers)
 
 
+atexit.register(_stop_listeners)
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,211 @@
+"""
+step-level profiling of the pipeline stages.
+
+off by default; switched on with `profiling.enabled` in config.yaml or the
+STUDENT_PROFILE=1 environment variable (STUDENT_PROFILE=0 forces it off).
+a stage's main() calls `start`, wraps its steps in `step` and calls `save`:
+
+    profiling.start("training", config)
+    with profiling.step("load") as s:
+        X, y = load_arrays(...)
+        s.add(X=X, y=y)
+    profiling.save()
+
+every step records wall time, cpu time (own and of finished child
+processes), the process's peak rss after the step, how much the step
+raised it, and the size of the arrays handed to `add`. a step entered
+several times (e.g. once per csv chunk) accumulates. the result goes to
+<profiling.dir>/<stage>.json, a metrics file of the stage in dvc.yaml, so
+`dvc metrics diff` shows timings next to the MAE. with profiling off the
+file is still written, as an empty `{}`, so the declared metric always
+exists.
+
+one step can also be run under cProfile: `profiling.cprofile` (or
+STUDENT_PROFILE_CPROFILE) names it as "<stage>.<step>", and the dump is
+written to <profiling.cprofile_dir>/<stage>.<step>.prof.
+
+when profiling is off `step` returns a shared no-op context, so the
+instrumentation costs one function call per step.
+"""
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from src.utils.logger import get_logger
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+logger = get_logger("profiling.log")
+
+ENV_VAR = "STUDENT_PROFILE"
+CPROFILE_ENV_VAR = "STUDENT_PROFILE_CPROFILE"
+
+_current = {}
+# where `save` writes, kept apart from _current so it is known with profiling off.
+_output = {}
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # ru_maxrss is in kilobytes on linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child_cpu_seconds() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Step:
+    """measurements of one named step, updated every time the step runs."""
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.child_cpu_s = 0.0
+        self.peak_rss_mb = 0.0
+        self.rss_growth_mb = 0.0
+        self.arrays_mb = {}
+
+    def add(self, **arrays) -> None:
+        """record the size of arrays the step produced or consumed."""
+        for name, array in arrays.items():
+            self.arrays_mb[name] = round(getattr(array, "nbytes", 0) / 2 ** 20, 3)
+
+    def to_dict(self) -> dict:
+        result = {
+            "calls": self.calls,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": round(self.cpu_s, 4),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "rss_growth_mb": round(self.rss_growth_mb, 1),
+        }
+        if self.child_cpu_s:
+            result["child_cpu_s"] = round(self.child_cpu_s, 4)
+        if self.arrays_mb:
+            result["arrays_mb"] = self.arrays_mb
+        return result
+
+
+class _NullStep:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **arrays) -> None:
+        pass
+
+
+_NULL_STEP = _NullStep()
+
+
+def enabled(config: dict) -> bool:
+    env = os.environ.get(ENV_VAR)
+    if env is not None and env != "":
+        return env.lower() not in ("0", "false", "no", "off")
+    return bool(config.get("profiling", {}).get("enabled", False))
+
+
+def start(stage: str, config: dict) -> None:
+    """begin profiling `stage` when profiling is switched on."""
+    _current.clear()
+    settings = config.get("profiling", {})
+    _output.update(stage=stage, output_dir=settings.get("dir", "profile"))
+    if not enabled(config):
+        return
+    _current.update(
+        stage=stage,
+        steps={},
+        cprofile=os.environ.get(CPROFILE_ENV_VAR) or settings.get("cprofile"),
+        cprofile_dir=settings.get("cprofile_dir", ".cache/profile"),
+        wall=time.perf_counter(),
+        cpu=time.process_time(),
+        child_cpu=_child_cpu_seconds(),
+    )
+    logger.info(f"Profiling stage {stage}.")
+
+
+def step(name: str, **arrays):
+    """context manager timing the step `name` of the current stage."""
+    if not _current:
+        return _NULL_STEP
+    return _profiled_step(name, arrays)
+
+
+@contextmanager
+def _profiled_step(name: str, arrays: dict):
+    record = _current["steps"].setdefault(name, Step())
+    record.add(**arrays)
+
+    profiler = None
+    if _current["cprofile"] == f"{_current['stage']}.{name}":
+        profiler = cProfile.Profile()
+
+    rss_before = _peak_rss_mb()
+    child_cpu = _child_cpu_seconds()
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record.wall_s += time.perf_counter() - wall
+        record.cpu_s += time.process_time() - cpu
+        record.child_cpu_s += _child_cpu_seconds() - child_cpu
+        record.peak_rss_mb = _peak_rss_mb()
+        record.rss_growth_mb += record.peak_rss_mb - rss_before
+        record.calls += 1
+        if profiler is not None:
+            _dump(profiler, name)
+
+
+def record(name: str, **values) -> None:
+    """store measurements taken elsewhere (e.g. by a pool worker) as a step."""
+    if _current:
+        _current["steps"][name] = values
+
+
+def _dump(profiler: cProfile.Profile, name: str) -> None:
+    os.makedirs(_current["cprofile_dir"], exist_ok=True)
+    path = os.path.join(_current["cprofile_dir"], f"{_current['stage']}.{name}.prof")
+    profiler.dump_stats(path)
+    logger.info(f"cProfile of {_current['stage']}.{name} written to {path}")
+
+
+def save() -> None:
+    """write the current stage's measurements (`{}` with profiling off) to <profiling.dir>/<stage>.json."""
+    if not _output:
+        return
+    os.makedirs(_output["output_dir"], exist_ok=True)
+    path = os.path.join(_output["output_dir"], f"{_output['stage']}.json")
+    if not _current:
+        with open(path, "w") as f:
+            json.dump({}, f)
+        return
+    report = {
+        "wall_s": round(time.perf_counter() - _current["wall"], 4),
+        "cpu_s": round(time.process_time() - _current["cpu"], 4),
+        "child_cpu_s": round(_child_cpu_seconds() - _current["child_cpu"], 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "steps": {
+            name: s.to_dict() if isinstance(s, Step) else s for name, s in _current["steps"].items()
+        },
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Profile of {_current['stage']} written to {path} "
+                f"(wall {report['wall_s']:.2f}s, peak rss {report['peak_rss_mb']:.0f} MB)")
@@ -0,0 +1,80 @@
+"""
+column layout of the raw student csv and of the preprocessed feature matrix.
+"""
+
+ID_COLUMN = "StudentID"
+TARGET_COLUMN = "GPA"
+DROP_COLUMNS = ["StudentID", "GradeClass"]
+
+# order of the 12 columns in features.npy (same order as the raw csv).
+FEATURE_COLUMNS = [
+    "Age",
+    "Gender",
+    "Ethnicity",
+    "ParentalEducation",
+    "StudyTimeWeekly",
+    "Absences",
+    "Tutoring",
+    "ParentalSupport",
+    "Extracurricular",
+    "Sports",
+    "Music",
+    "Volunteering",
+]
+
+# compact parse dtypes for the streaming reader. everything except the two
+# continuous columns is a small integer code or a 0/1 flag.
+COLUMN_DTYPES = {
+    "Age": "int8",
+    "Gender": "int8",
+    "Ethnicity": "int8",
+    "ParentalEducation": "int8",
+    "StudyTimeWeekly": "float32",
+    "Absences": "int8",
+    "Tutoring": "int8",
+    "ParentalSupport": "int8",
+    "Extracurricular": "int8",
+    "Sports": "int8",
+    "Music": "int8",
+    "Volunteering": "int8",
+    "GPA": "float32",
+}
+
+# every value the streamlit form (frontend/main.py) can send, as inclusive
+# integer ranges in FEATURE_COLUMNS order.
+UI_GRID = {
+    "Age": (15, 18),
+    "Gender": (0, 1),
+    "Ethnicity": (0, 3),
+    "ParentalEducation": (0, 4),
+    "StudyTimeWeekly": (0, 20),
+    "Absences": (0, 30),
+    "Tutoring": (0, 1),
+    "ParentalSupport": (0, 4),
+    "Extracurricular": (0, 1),
+    "Sports": (0, 1),
+    "Music": (0, 1),
+    "Volunteering": (0, 1),
+}
+
+# declarative checks of the 15 raw csv columns, applied by src.validation
+# before preprocessing. "int" columns must hold whole numbers, "range" is
+# inclusive (None = open), "values" lists the allowed codes.
+_FLAG = {"type": "int", "values": (0, 1)}
+CSV_SCHEMA = {
+    "StudentID": {"type": "int", "range": (0, None)},
+    "Age": {"type": "int", "range": (15, 18)},
+    "Gender": _FLAG,
+    "Ethnicity": {"type": "int", "values": (0, 1, 2, 3)},
+    "ParentalEducation": {"type": "int", "values": (0, 1, 2, 3, 4)},
+    "StudyTimeWeekly": {"type": "float", "range": (0, 20)},
+    "Absences": {"type": "int", "range": (0, 30)},
+    "Tutoring": _FLAG,
+    "ParentalSupport": {"type": "int", "values": (0, 1, 2, 3, 4)},
+    "Extracurricular": _FLAG,
+    "Sports": _FLAG,
+    "Music": _FLAG,
+    "Volunteering": _FLAG,
+    "GPA": {"type": "float", "range": (0, 4)},
+    "GradeClass": {"type": "float", "values": (0, 1, 2, 3, 4)},
+}
@@ -0,0 +1,197 @@
+"""
+on-disk helpers for the preprocessed arrays.
+
+features.npy / labels.npy can be opened memory-mapped, folds are handed out
+as index arrays and rows are gathered in bounded chunks, so train and
+evaluate never hold more than one fold in memory.
+
+the column table (`.tbl`) is the compact copy written by preprocessing:
+a fixed size json header describing the schema followed by one contiguous,
+64 byte aligned block per column in its own dtype (int8 codes, float32
+continuous values).
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+TABLE_MAGIC = b"SPTB"
+TABLE_VERSION = 1
+# magic + version + json, padded; fixed so the row count can be rewritten in place.
+TABLE_HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+
+def load_arrays(feature_path: str, label_path: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """load features and labels, memory-mapped read-only when `mmap` is set."""
+    mode = "r" if mmap else None
+    return np.load(feature_path, mmap_mode=mode), np.load(label_path, mmap_mode=mode)
+
+
+def data_hash(*arrays: np.ndarray, chunk_size: int = 1 << 24) -> str:
+    """md5 over the raw bytes of the arrays, read in chunks (memmap friendly)."""
+    digest = hashlib.md5()
+    for array in arrays:
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        flat = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+        for start in range(0, len(flat), chunk_size):
+            digest.update(flat[start:start + chunk_size])
+    return digest.hexdigest()
+
+
+def fold_indices(n_rows: int, n_splits: int = 5, shuffle: bool = True,
+                 random_state: Optional[int] = 42) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    yield sorted (train, test) row indices of a KFold split.
+
+    the folds are the same as KFold(n_splits, shuffle, random_state).split(X)
+    but only the row count is needed, so the data itself is never touched.
+    sorted indices keep chunked reads from a memmap sequential.
+    """
+    from sklearn.model_selection import KFold
+
+    cv = KFold(n_splits=n_splits, shuffle=shuffle, random_state=random_state)
+    for train_idx, test_idx in cv.split(np.empty((n_rows, 0))):
+        yield np.sort(train_idx), np.sort(test_idx)
+
+
+def take_rows(array: np.ndarray, indices: np.ndarray, chunk_size: int = 100_000,
+              dtype=None) -> np.ndarray:
+    """
+    gather `array[indices]` chunk by chunk.
+
+    fancy indexing a memmap in one go builds a temporary index plan over the
+    whole selection; gathering in chunks into one preallocated output keeps
+    the extra memory at one chunk.
+    """
+    out = np.empty((len(indices),) + array.shape[1:], dtype=dtype or array.dtype)
+    for start in range(0, len(indices), chunk_size):
+        out[start:start + chunk_size] = array[indices[start:start + chunk_size]]
+    return out
+
+
+def predict_rows(model, array: np.ndarray, indices: np.ndarray, chunk_size: int = 100_000) -> np.ndarray:
+    """score `array[indices]` without materializing the selection."""
+    preds = np.empty(len(indices), dtype=np.float64)
+    for start in range(0, len(indices), chunk_size):
+        preds[start:start + chunk_size] = model.predict(array[indices[start:start + chunk_size]])
+    return preds
+
+
+def _column_layout(columns: Dict[str, str], n_rows: int) -> list:
+    layout = []
+    offset = TABLE_HEADER_SIZE
+    for name, dtype in columns.items():
+        layout.append({"name": name, "dtype": np.dtype(dtype).str, "offset": offset})
+        size = n_rows * np.dtype(dtype).itemsize
+        offset += -(-size // ALIGNMENT) * ALIGNMENT
+    return layout
+
+
+def _write_header(f, n_rows: int, layout: list) -> None:
+    header = json.dumps({"version": TABLE_VERSION, "n_rows": n_rows, "columns": layout}).encode()
+    block = TABLE_MAGIC + header
+    if len(block) > TABLE_HEADER_SIZE:
+        raise ValueError(f"table header too large: {len(block)} bytes")
+    f.seek(0)
+    f.write(block.ljust(TABLE_HEADER_SIZE, b" "))
+
+
+def create_table(path: str, columns: Dict[str, str], n_rows: int) -> Dict[str, np.memmap]:
+    """
+    allocate a column table for `n_rows` rows and return writable column maps.
+
+    args:
+    path: table file to create.
+    columns: ordered mapping of column name to numpy dtype.
+    n_rows: capacity in rows.
+    """
+    layout = _column_layout(columns, n_rows)
+    last = layout[-1]
+    end = last["offset"] + n_rows * np.dtype(last["dtype"]).itemsize
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        _write_header(f, n_rows, layout)
+        f.truncate(max(end, TABLE_HEADER_SIZE))
+
+    return {
+        col["name"]: np.memmap(path, dtype=col["dtype"], mode="r+", offset=col["offset"], shape=(n_rows,))
+        for col in layout
+    }
+
+
+def set_table_rows(path: str, n_rows: int) -> None:
+    """shrink the row count recorded in the header (column offsets stay put)."""
+    header, _ = open_table(path)
+    if n_rows > header["n_rows"]:
+        raise ValueError(f"cannot grow table from {header['n_rows']} to {n_rows} rows")
+    with open(path, "r+b") as f:
+        _write_header(f, n_rows, header["columns"])
+
+
+def open_table(path: str, columns: Optional[list] = None) -> Tuple[dict, Dict[str, np.memmap]]:
+    """
+    open a column table read-only.
+
+    return:
+    the parsed header and a dict of memory-mapped columns (only the
+    requested ones when `columns` is given).
+    """
+    with open(path, "rb") as f:
+        block = f.read(TABLE_HEADER_SIZE)
+    if not block.startswith(TABLE_MAGIC):
+        raise ValueError(f"{path} is not a column table")
+    header = json.loads(block[len(TABLE_MAGIC):].decode().rstrip())
+
+    n_rows = header["n_rows"]
+    maps = {}
+    for col in header["columns"]:
+        if columns is not None and col["name"] not in columns:
+            continue
+        maps[col["name"]] = np.memmap(path, dtype=col["dtype"], mode="r",
+                                      offset=col["offset"], shape=(n_rows,))
+    return header, maps
+
+
+def table_to_matrix(table: Dict[str, np.ndarray], columns: list, rows=None,
+                    dtype=np.float32) -> np.ndarray:
+    """stack the given columns (optionally a row selection) into a 2d matrix."""
+    n = len(next(iter(table.values()))) if rows is None else len(rows)
+    out = np.empty((n, len(columns)), dtype=dtype)
+    for j, name in enumerate(columns):
+        out[:, j] = table[name] if rows is None else table[name][rows]
+    return out
+
+
+def share_array(array: np.ndarray):
+    """
+    copy `array` once into a named shared memory block.
+
+    return:
+    the SharedMemory object (the caller closes and unlinks it) and a small
+    picklable descriptor that other processes pass to `attach_array`.
+    """
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, {"name": shm.name, "shape": array.shape, "dtype": array.dtype.str}
+
+
+def attach_array(descriptor: dict):
+    """
+    map a block created by `share_array` as a read-only array without copying.
+
+    return:
+    the SharedMemory handle (keep it alive while the array is used) and the array.
+    """
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(name=descriptor["name"])
+    array = np.ndarray(descriptor["shape"], dtype=descriptor["dtype"], buffer=shm.buf)
+    array.flags.writeable = False
+    return shm, array
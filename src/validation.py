@@ -0,0 +1,268 @@
+"""
+schema validation of the raw student csv, ahead of preprocessing.
+
+python -m src.validation data/raw/student.csv [--quarantine rejected.csv]
+
+every column of src.utils.schema.CSV_SCHEMA is checked as a whole numpy
+array per chunk: missing, not a number, not a whole number (for "int"
+columns), outside "range", not one of "values". a column that parsed as
+numbers skips the string conversion entirely, so clean chunks cost a few
+vectorized comparisons per column. rejected rows are appended, with their
+original values and a `reason` column, to the quarantine csv; only clean
+rows, cast to the requested dtypes, are passed on.
+"""
+import os
+import json
+import argparse
+import warnings
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from src.utils.config import load_config
+from src.utils.logger import get_logger
+from src.utils.schema import CSV_SCHEMA
+
+logger = get_logger("preprocessing.log")
+
+# dtypes of the clean frame when none are requested, like an untyped pd.read_csv.
+DEFAULT_DTYPES = {"int": "int64", "float": "float64"}
+
+
+def check_column(name: str, column: pd.Series) -> list:
+    """
+    return:
+    (problem, boolean row mask) for every check of `name` that some rows fail,
+    and the column as float64 values.
+    """
+    spec = CSV_SCHEMA[name]
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(values)
+        not_number = np.zeros(len(values), dtype=bool)
+    else:
+        missing = column.isna().to_numpy()
+        values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        not_number = np.isnan(values) & ~missing
+
+    problems = [("missing", missing), ("not a number", not_number)]
+    present = ~(missing | not_number)
+    with np.errstate(invalid="ignore"):
+        if spec["type"] == "int":
+            fraction = present & (values != np.floor(values))
+            problems.append(("not a whole number", fraction))
+            present &= ~fraction
+        low, high = spec.get("range", (None, None))
+        if low is not None:
+            problems.append((f"below {low}", present & (values < low)))
+        if high is not None:
+            problems.append((f"above {high}", present & (values > high)))
+        if "values" in spec:
+            problems.append((f"not in {list(spec['values'])}", present & ~np.isin(values, spec["values"])))
+    return [(problem, mask) for problem, mask in problems if mask.any()], values
+
+
+class Quarantine:
+    """
+    csv of rejected rows (original values plus `reason`) and per-problem counts.
+
+    the file is always (re)written, with just the header when nothing was
+    rejected, so a clean run leaves no stale rejects behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.rejected = 0
+        self.problems = Counter()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                f.write(",".join(list(CSV_SCHEMA) + ["reason"]) + "\n")
+
+    def add(self, rows: pd.DataFrame, reasons: list) -> None:
+        self.rejected += len(rows)
+        if self.path:
+            out = rows.reindex(columns=list(CSV_SCHEMA))
+            out["reason"] = reasons
+            out.to_csv(self.path, mode="a", header=False, index=False)
+
+    def add_malformed(self, messages: list) -> None:
+        """lines the csv parser skipped, as an empty row with the parser's reason."""
+        self.rows += len(messages)
+        self.rejected += len(messages)
+        self.problems["malformed line"] += len(messages)
+        if self.path:
+            with open(self.path, "a") as f:
+                for message in messages:
+                    f.write("," * len(CSV_SCHEMA) + f'"{message}"\n')
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "accepted": self.rows - self.rejected,
+            "rejected": self.rejected,
+            "problems": dict(self.problems.most_common()),
+        }
+
+
+def validate(df: pd.DataFrame, quarantine: Quarantine = None, dtypes: dict = None,
+             columns: list = None) -> pd.DataFrame:
+    """
+    check a raw frame against CSV_SCHEMA.
+
+    args:
+    df: raw rows with (at least) every checked column.
+    quarantine: receives the rejected rows; they are only counted when None.
+    dtypes: column -> dtype of the clean output (the CSV_SCHEMA columns in
+        `dtypes` are returned); default every checked column as int64/float64.
+    columns: the CSV_SCHEMA columns to check; default all of them.
+
+    return:
+    the clean rows, typed, with a fresh index.
+    """
+    checked = list(columns) if columns else list(CSV_SCHEMA)
+    missing_columns = [name for name in checked if name not in df.columns]
+    if missing_columns:
+        raise ValueError(f"csv is missing the columns {missing_columns}")
+
+    columns = list(dtypes) if dtypes else checked
+    bad = np.zeros(len(df), dtype=bool)
+    failures = []
+    clean_values = {}
+    for name in checked:
+        problems, values = check_column(name, df[name])
+        for problem, mask in problems:
+            bad |= mask
+            failures.append((name, problem, mask))
+        if name in columns:
+            clean_values[name] = values
+
+    if quarantine is not None:
+        quarantine.rows += len(df)
+        for name, problem, mask in failures:
+            quarantine.problems[f"{name} {problem}"] += int(mask.sum())
+
+    if bad.any():
+        # strings only for the few rejected rows.
+        bad_rows = np.flatnonzero(bad)
+        position = {row: i for i, row in enumerate(bad_rows)}
+        reasons = [[] for _ in bad_rows]
+        for name, problem, mask in failures:
+            raw = df[name].to_numpy()
+            for row in np.flatnonzero(mask):
+                value = raw[row].item() if isinstance(raw[row], np.generic) else raw[row]
+                reasons[position[row]].append(f"{name} {problem} ({value!r})")
+        if quarantine is not None:
+            quarantine.add(df.iloc[bad_rows], ["; ".join(r) for r in reasons])
+        else:
+            logger.warning(f"{len(bad_rows)} invalid rows dropped, e.g. {'; '.join(reasons[0])}")
+
+    keep = ~bad
+    out = {}
+    for name in columns:
+        dtype = dtypes[name] if dtypes else DEFAULT_DTYPES[CSV_SCHEMA[name]["type"]]
+        out[name] = clean_values[name][keep].astype(dtype)
+    return pd.DataFrame(out)
+
+
+def read_clean(path: str, quarantine: Quarantine = None, dtypes: dict = None, chunk_size: int = 100_000,
+               columns: list = None):
+    """
+    yield validated, typed chunks of the csv at `path`.
+
+    the csv is parsed with plain type inference (a stray string makes only
+    its own column and chunk fall back to strings). lines with the wrong
+    number of fields are skipped by the parser, which reports them as
+    ParserWarnings; those are quarantined as malformed lines. with `columns`
+    only those are read and checked.
+    """
+    reader = pd.read_csv(path, chunksize=chunk_size, on_bad_lines="warn", usecols=columns)
+    while True:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", pd.errors.ParserWarning)
+            chunk = next(reader, None)
+        skipped = []
+        for warning in caught:
+            if issubclass(warning.category, pd.errors.ParserWarning):
+                skipped += [line for line in str(warning.message).splitlines() if line]
+            else:
+                warnings.warn(warning.message, warning.category)
+        if skipped:
+            if quarantine is not None:
+                quarantine.add_malformed(skipped)
+            else:
+                logger.warning(f"{len(skipped)} malformed lines skipped, e.g. {skipped[0]}")
+        if chunk is None:
+            break
+        yield validate(chunk, quarantine, dtypes, columns)
+
+
+def read_all(path: str, quarantine: Quarantine = None, dtypes: dict = None,
+             chunk_size: int = 100_000) -> pd.DataFrame:
+    """the clean rows of the whole csv as one frame (empty, with the typed columns, for a header-only csv)."""
+    chunks = list(read_clean(path, quarantine, dtypes, chunk_size))
+    if not chunks:
+        return validate(pd.DataFrame(columns=list(CSV_SCHEMA)), quarantine, dtypes)
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def finish(quarantine: Quarantine, max_reject_fraction: float = None) -> dict:
+    """
+    log the validation summary.
+
+    raises ValueError when more than `max_reject_fraction` of the rows were
+    rejected, or when there were no rows at all: at that point the export is
+    broken, not a few rows. without a limit an empty csv is only logged.
+    """
+    summary = quarantine.summary()
+    problems = f" {summary['problems']}" if summary["problems"] else ""
+    logger.info(f"validation: {summary['accepted']} of {summary['rows']} rows accepted, "
+                f"{summary['rejected']} quarantined to {quarantine.path}{problems}")
+    if not summary["rows"]:
+        if max_reject_fraction is not None:
+            raise ValueError("the csv has no data rows, nothing to validate")
+        logger.warning("validation: the csv has no data rows.")
+        return summary
+    if max_reject_fraction is not None and \
+            summary["rejected"] / summary["rows"] > max_reject_fraction:
+        raise ValueError(f"{summary['rejected']} of {summary['rows']} rows failed validation "
+                         f"(more than {max_reject_fraction:.0%}), see {quarantine.path}")
+    return summary
+
+
+def open_quarantine(config: dict):
+    """the configured Quarantine, or None when preprocessing.validation is off."""
+    settings = config.get("preprocessing", {}).get("validation", {})
+    if not settings.get("enabled", True):
+        return None
+    return Quarantine(settings.get("quarantine_path", "data/preprocess/quarantine.csv"))
+
+
+def max_reject_fraction(config: dict):
+    return config.get("preprocessing", {}).get("validation", {}).get("max_reject_fraction")
+
+
+def main():
+    config = load_config()
+    settings = config.get("preprocessing", {})
+
+    parser = argparse.ArgumentParser(description="Validate a student csv against the schema.")
+    parser.add_argument("input", nargs="?", default=config["paths"]["raw_data"])
+    parser.add_argument("--quarantine", default="quarantine.csv", help="csv for the rejected rows")
+    parser.add_argument("--chunk-size", type=int, default=settings.get("chunk_size", 100_000))
+    args = parser.parse_args()
+
+    try:
+        quarantine = Quarantine(args.quarantine)
+        for _ in read_clean(args.input, quarantine, chunk_size=args.chunk_size):
+            pass
+        print(json.dumps(finish(quarantine), indent=2))
+    except Exception as e:
+        logger.exception(f"Validation failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()